@@ -8,9 +8,9 @@ from utils.flashcard_generator import FlashcardGenerator
 from utils.google_drive_sync import GoogleDriveSync
 from utils.auth import GoogleAuth
 from utils.error_handler import ErrorHandler
-from utils.auth_manager import AuthManager
-from utils.avatar_generator import AvatarGenerator
-from utils.avatar_system_fixed import FixedAvatarGenerator
+from utils.auth_manager import get_auth_manager
+from utils.avatar_generator import get_avatar_generator
+from utils.avatar_system_fixed import get_fixed_avatar_generator
 from database import get_db_manager
 
 # Page configuration for PWA
@@ -563,12 +563,9 @@ def create_top_navigation_bar(user_info, avatar_config, auth_manager):
     # Create HTML structure for top navigation
     avatar_html = ""
     if avatar_config:
-        avatar_generator = FixedAvatarGenerator()
-        avatar_svg = avatar_generator.render_avatar_svg(avatar_config)
-        import base64
-        svg_bytes = avatar_svg.encode('utf-8')
-        svg_b64 = base64.b64encode(svg_bytes).decode('utf-8')
-        avatar_html = f'<img src="data:image/svg+xml;base64,{svg_b64}" class="user-avatar" alt="User Avatar">'
+        avatar_generator = get_fixed_avatar_generator()
+        svg_data_url = avatar_generator.render_avatar_data_url(avatar_config)
+        avatar_html = f'<img src="{svg_data_url}" class="user-avatar" alt="User Avatar">'
     else:
         avatar_html = '<div class="user-avatar">👤</div>'
     
@@ -606,14 +603,10 @@ def create_homepage():
     if avatar_config:
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            avatar_generator = AvatarGenerator()
-            avatar_svg = avatar_generator.render_avatar_svg(avatar_config)
+            avatar_generator = get_avatar_generator()
             
-            # Convert SVG to image to prevent code display
-            import base64
-            svg_bytes = avatar_svg.encode('utf-8')
-            svg_b64 = base64.b64encode(svg_bytes).decode('utf-8')
-            svg_data_url = f"data:image/svg+xml;base64,{svg_b64}"
+            # Show the SVG as an image (data URL cached per config) to prevent code display
+            svg_data_url = avatar_generator.render_avatar_data_url(avatar_config)
             
             st.image(svg_data_url, width=120)
             st.markdown(f"<p style='text-align: center; margin-top: 0.5rem; font-weight: bold;'>Welcome back, {st.session_state.user_name}!</p>", unsafe_allow_html=True)
@@ -954,14 +947,10 @@ def profile_section():
         # Display current avatar
         current_avatar = st.session_state.get('user_avatar', {})
         if current_avatar:
-            avatar_generator = FixedAvatarGenerator()
-            avatar_svg = avatar_generator.render_avatar_svg(current_avatar)
+            avatar_generator = get_fixed_avatar_generator()
             
-            # Convert SVG to data URL
-            import base64
-            svg_bytes = avatar_svg.encode('utf-8')
-            svg_b64 = base64.b64encode(svg_bytes).decode('utf-8')
-            svg_data_url = f"data:image/svg+xml;base64,{svg_b64}"
+            # SVG as a data URL (cached per config)
+            svg_data_url = avatar_generator.render_avatar_data_url(current_avatar)
             st.image(svg_data_url, width=150)
         else:
             st.markdown("👤 No avatar set")
@@ -984,40 +973,40 @@ def profile_section():
     st.markdown("### 🎨 Customize Your Avatar")
     st.info("Design your unique avatar that represents you throughout StudyGen!")
     
-    # Initialize fixed avatar generator
-    avatar_generator = FixedAvatarGenerator()
+    # Shared fixed avatar generator
+    avatar_generator = get_fixed_avatar_generator()
     
     # Get current avatar config or create new one
     current_config = st.session_state.get('user_avatar', {})
     if not current_config:
         current_config = avatar_generator.generate_random_avatar()
     
-    # Render avatar customizer with live updates
-    new_avatar_config = avatar_generator.render_avatar_customizer_with_live_update(current_config)
+    # Render avatar customizer with live updates; the save button submits the form,
+    # so selections that haven't been applied yet are saved too
+    new_avatar_config, save_clicked = avatar_generator.render_avatar_customizer_with_live_update(
+        current_config, save_label="💾 Save Avatar Changes"
+    )
     
     st.markdown("---")
     
-    # Save avatar button
-    col1, col2, col3 = st.columns([1, 2, 1])
-    with col2:
-        if st.button("💾 Save Avatar Changes", type="primary", use_container_width=True):
-            with st.spinner("Saving your new avatar..."):
-                # Update user avatar in database
-                def save_avatar():
-                    db.update_user_avatar(st.session_state.user_id, new_avatar_config)
-                    st.session_state.user_avatar = new_avatar_config
-                    return True
-                
-                result = ErrorHandler.handle_database_operation(save_avatar, "avatar save")
+    if save_clicked:
+        with st.spinner("Saving your new avatar..."):
+            # Update user avatar in database
+            def save_avatar():
+                db.update_user_avatar(st.session_state.user_id, new_avatar_config)
+                st.session_state.user_avatar = new_avatar_config
+                return True
+            
+            result = ErrorHandler.handle_database_operation(save_avatar, "avatar save")
+            
+            if result:
+                ErrorHandler.show_success("Avatar updated successfully!", "Your new avatar is now visible throughout the app.")
+                st.balloons()
                 
-                if result:
-                    ErrorHandler.show_success("Avatar updated successfully!", "Your new avatar is now visible throughout the app.")
-                    st.balloons()
-                    
-                    # Small delay to show success message
-                    import time
-                    time.sleep(1)
-                    st.rerun()
+                # Small delay to show success message
+                import time
+                time.sleep(1)
+                st.rerun()
 
 def dashboard_section():
     """Database-driven dashboard with comprehensive statistics"""
@@ -2243,7 +2232,7 @@ def init_app():
         
         # Initialize authentication manager
         if 'auth_manager' not in st.session_state:
-            st.session_state.auth_manager = AuthManager(st.session_state.db_manager)
+            st.session_state.auth_manager = get_auth_manager(st.session_state.db_manager)
         
         # Run main application
         main()
@@ -4,7 +4,7 @@ from datetime import datetime, timezone, timedelta
 from sqlalchemy import create_engine, Column, String, Text, DateTime, Integer, Boolean, ForeignKey, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
 from sqlalchemy.exc import OperationalError, DisconnectionError
 from sqlalchemy.pool import QueuePool
 import streamlit as st
@@ -268,28 +268,36 @@ class DatabaseManager:
             session.close()
     
     def create_user_with_password(self, user_data):
-        """Create new user with password authentication"""
+        """Create new user with password authentication; returns None if the email is taken"""
         session = self.get_session()
         try:
-            user = User(
-                email=user_data['email'],
-                name=user_data['name'],
-                password_hash=user_data['password_hash'],
-                salt=user_data['salt'],
-                avatar_config=user_data.get('avatar_config', {}),
-                preferences=user_data.get('preferences', {})
+            stmt = (
+                pg_insert(User)
+                .values(
+                    email=user_data['email'],
+                    name=user_data['name'],
+                    password_hash=user_data['password_hash'],
+                    salt=user_data['salt'],
+                    avatar_config=user_data.get('avatar_config', {}),
+                    preferences=user_data.get('preferences', {})
+                )
+                .on_conflict_do_nothing(index_elements=[User.email])
+                .returning(User.id, User.email, User.name, User.avatar_config,
+                           User.preferences, User.created_at, User.last_active)
             )
-            session.add(user)
+            row = session.execute(stmt).first()
             session.commit()
-            session.refresh(user)
+            if row is None:
+                return None
             
             return {
-                'id': user.id,
-                'email': user.email,
-                'name': user.name,
-                'preferences': user.preferences,
-                'created_at': user.created_at,
-                'last_active': user.last_active
+                'id': row.id,
+                'email': row.email,
+                'name': row.name,
+                'avatar_config': row.avatar_config or {},
+                'preferences': row.preferences,
+                'created_at': row.created_at,
+                'last_active': row.last_active
             }
         finally:
             session.close()
@@ -305,6 +313,18 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def update_user_password(self, user_id, password_hash, salt):
+        """Replace a user's stored password hash and salt"""
+        session = self.get_session()
+        try:
+            session.query(User).filter(User.id == user_id).update({
+                'password_hash': password_hash,
+                'salt': salt
+            })
+            session.commit()
+        finally:
+            session.close()
+    
     def save_document(self, user_id, title, filename, file_size, content_text):
         """Save a processed document with retry logic for large files"""
         def _save_operation():
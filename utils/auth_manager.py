@@ -1,43 +1,576 @@
 import streamlit as st
-import hashlib
-import secrets
+import base64
+import hmac
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import cached_property, lru_cache
+from hashlib import scrypt as _scrypt, sha256 as _sha256
+from secrets import token_bytes as _token_bytes
+from sqlalchemy.exc import SQLAlchemyError
 from utils.error_handler import ErrorHandler
-from utils.avatar_system_fixed import FixedAvatarGenerator
+
+# Static markup for the login/register page, built once at import
+_LOGIN_HEADER_HTML = """
+<div style="text-align: center; padding: 2rem 0;">
+    <h1 style="
+        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
+        -webkit-background-clip: text;
+        -webkit-text-fill-color: transparent;
+        font-size: 3rem;
+        margin-bottom: 0.5rem;
+    ">🎓 StudyGen</h1>
+    <p style="font-size: 1.2rem; color: #666; margin: 0;">
+        Level up your learning with AI-powered study materials!
+    </p>
+</div>
+"""
+
+_WHAT_YOU_GET_HTML = """### 🎮 What You'll Get:
+
+<div style="display: grid; grid-template-columns: repeat(3, 1fr); gap: 1rem; margin-bottom: 1rem;">
+    <div>🏆 <strong>Badges &amp; Achievements</strong></div>
+    <div>📊 <strong>Progress Tracking</strong></div>
+    <div>🎨 <strong>Custom Avatar</strong></div>
+</div>
+"""
+
+# Styles for the avatar-creation registration step
+_AVATAR_CSS = """
+<style>
+.avatar-creation-step {
+    animation: stepFadeIn 0.6s ease-in-out;
+    transition: all 0.3s ease;
+}
+
+.step-header {
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+    color: white;
+    padding: 1.5rem;
+    border-radius: 15px;
+    text-align: center;
+    animation: headerSlideIn 0.8s ease-out;
+    margin-bottom: 1.5rem;
+    box-shadow: 0 4px 15px rgba(102, 126, 234, 0.3);
+}
+
+.step-description {
+    background: linear-gradient(135deg, #e3f2fd 0%, #f3e5f5 100%);
+    padding: 1rem;
+    border-radius: 10px;
+    text-align: center;
+    color: #4a5568;
+    margin-bottom: 2rem;
+    animation: descriptionFadeIn 1s ease-in-out;
+    border-left: 4px solid #667eea;
+}
+
+.action-buttons {
+    animation: buttonsSlideUp 1.2s ease-out;
+}
+
+@keyframes stepFadeIn {
+    from { opacity: 0; transform: translateY(20px); }
+    to { opacity: 1; transform: translateY(0); }
+}
+
+@keyframes headerSlideIn {
+    from { opacity: 0; transform: scale(0.9) translateY(-10px); }
+    to { opacity: 1; transform: scale(1) translateY(0); }
+}
+
+@keyframes descriptionFadeIn {
+    from { opacity: 0; transform: translateX(-10px); }
+    to { opacity: 1; transform: translateX(0); }
+}
+
+@keyframes buttonsSlideUp {
+    from { opacity: 0; transform: translateY(20px); }
+    to { opacity: 1; transform: translateY(0); }
+}
+</style>
+"""
+
+# Styles and animations for the welcome page
+_WELCOME_CSS = """
+<style>
+@import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
+
+/* Welcome page animations */
+@keyframes fadeInUp {
+    from {
+        opacity: 0;
+        transform: translateY(30px);
+    }
+    to {
+        opacity: 1;
+        transform: translateY(0);
+    }
+}
+
+@keyframes slideInLeft {
+    from {
+        opacity: 0;
+        transform: translateX(-50px);
+    }
+    to {
+        opacity: 1;
+        transform: translateX(0);
+    }
+}
+
+@keyframes slideInRight {
+    from {
+        opacity: 0;
+        transform: translateX(50px);
+    }
+    to {
+        opacity: 1;
+        transform: translateX(0);
+    }
+}
+
+@keyframes bounceIn {
+    0% {
+        opacity: 0;
+        transform: scale(0.8);
+    }
+    50% {
+        opacity: 0.8;
+        transform: scale(1.05);
+    }
+    100% {
+        opacity: 1;
+        transform: scale(1);
+    }
+}
+
+@keyframes pulse {
+    0%, 100% {
+        transform: scale(1);
+    }
+    50% {
+        transform: scale(1.02);
+    }
+}
+
+@keyframes gradientShift {
+    0% {
+        background-position: 0% 50%;
+    }
+    50% {
+        background-position: 100% 50%;
+    }
+    100% {
+        background-position: 0% 50%;
+    }
+}
+
+.welcome-container {
+    max-width: 800px;
+    margin: 0 auto;
+    padding: 3rem;
+    text-align: center;
+    font-family: 'Inter', sans-serif;
+}
+
+.welcome-header {
+    margin-bottom: 3rem;
+    animation: fadeInUp 1s ease-out;
+}
+
+.welcome-header h1 {
+    background: linear-gradient(135deg, #667eea 0%, #764ba2 50%, #667eea 100%);
+    background-size: 200% 200%;
+    animation: gradientShift 3s ease-in-out infinite;
+    -webkit-background-clip: text;
+    -webkit-text-fill-color: transparent;
+    background-clip: text;
+    font-size: 3rem;
+    margin-bottom: 1rem;
+    font-weight: 700;
+    text-shadow: 0 4px 8px rgba(102, 126, 234, 0.3);
+}
+
+.welcome-header p {
+    color: #6b7280;
+    font-size: 1.2rem;
+    max-width: 600px;
+    margin: 0 auto;
+    line-height: 1.6;
+    animation: fadeInUp 1s ease-out 0.3s both;
+}
+
+.choice-card {
+    background: linear-gradient(135deg, #ffffff 0%, #f8f9ff 100%);
+    border-radius: 20px;
+    padding: 2rem;
+    box-shadow: 0 10px 30px rgba(0,0,0,0.1);
+    border: 2px solid transparent;
+    transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
+    margin-bottom: 1.5rem;
+    position: relative;
+    overflow: hidden;
+}
+
+.choice-card::before {
+    content: '';
+    position: absolute;
+    top: 0;
+    left: -100%;
+    width: 100%;
+    height: 100%;
+    background: linear-gradient(90deg, transparent, rgba(102, 126, 234, 0.1), transparent);
+    transition: left 0.6s ease;
+}
+
+.choice-card:hover::before {
+    left: 100%;
+}
+
+.choice-card:hover {
+    border-color: #667eea;
+    transform: translateY(-8px) scale(1.02);
+    box-shadow: 0 20px 50px rgba(102, 126, 234, 0.25);
+    background: linear-gradient(135deg, #ffffff 0%, #f0f4ff 100%);
+}
+
+.demo-card {
+    animation: slideInLeft 0.8s ease-out 0.6s both;
+}
+
+.signup-card {
+    animation: slideInRight 0.8s ease-out 0.9s both;
+}
+
+.choice-icon {
+    font-size: 3rem;
+    margin-bottom: 1rem;
+    animation: bounceIn 0.6s ease-out 1.2s both;
+    display: inline-block;
+    transition: transform 0.3s ease;
+}
+
+.choice-card:hover .choice-icon {
+    transform: scale(1.2) rotate(5deg);
+    animation: pulse 1s ease-in-out infinite;
+}
+
+.choice-title {
+    font-size: 1.5rem;
+    font-weight: 600;
+    color: #2d3748;
+    margin-bottom: 1rem;
+    animation: fadeInUp 0.6s ease-out 1.4s both;
+}
+
+.choice-description {
+    color: #6b7280;
+    line-height: 1.5;
+    margin-bottom: 1.5rem;
+    animation: fadeInUp 0.6s ease-out 1.6s both;
+}
+
+.features-section {
+    animation: fadeInUp 1s ease-out 1.8s both;
+}
+
+.feature-grid {
+    display: grid;
+    grid-template-columns: repeat(3, 1fr);
+    gap: 1rem;
+}
+
+.feature-item {
+    animation: fadeInUp 0.6s ease-out both;
+}
+
+.feature-item:nth-child(1) {
+    animation-delay: 2s;
+}
+
+.feature-item:nth-child(2) {
+    animation-delay: 2.2s;
+}
+
+.feature-item:nth-child(3) {
+    animation-delay: 2.4s;
+}
+
+/* Button animations */
+.stButton > button {
+    transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+    position: relative;
+    overflow: hidden;
+}
+
+.stButton > button::before {
+    content: '';
+    position: absolute;
+    top: 50%;
+    left: 50%;
+    width: 0;
+    height: 0;
+    background: rgba(255, 255, 255, 0.3);
+    border-radius: 50%;
+    transform: translate(-50%, -50%);
+    transition: width 0.6s ease, height 0.6s ease;
+}
+
+.stButton > button:hover::before {
+    width: 300px;
+    height: 300px;
+}
+
+.stButton > button:hover {
+    transform: translateY(-2px) scale(1.05);
+    box-shadow: 0 8px 25px rgba(102, 126, 234, 0.4);
+}
+
+/* Mobile responsiveness */
+@media (max-width: 768px) {
+    .welcome-header h1 {
+        font-size: 2.5rem;
+    }
+
+    .choice-card {
+        padding: 1.5rem;
+        margin-bottom: 1rem;
+    }
+
+    .choice-icon {
+        font-size: 2.5rem;
+    }
+
+    .feature-grid {
+        grid-template-columns: 1fr;
+    }
+}
+</style>
+"""
+
+# Styles, wrapper, header and description for the avatar step, sent as one element
+_AVATAR_STEP_HTML = _AVATAR_CSS + (
+    '<div class="avatar-creation-step">'
+    '<div class="step-header"><h1 style="margin: 0;">🎨 Create Your Avatar!</h1></div>'
+    '<div class="step-description">🌟 Design your unique study companion to represent you in StudyGen! '
+    'This avatar will appear throughout your learning journey.</div>'
+)
+
+_WELCOME_HEADER_HTML = """
+<div class="welcome-container">
+    <div class="welcome-header">
+        <h1>🎓 Welcome to StudyGen</h1>
+        <p>Transform any PDF into interactive flashcards and quizzes. Choose how you'd like to get started!</p>
+    </div>
+</div>
+"""
+
+_DEMO_CARD_HTML = """
+<div class="choice-card demo-card">
+    <div class="choice-icon">🚀</div>
+    <div class="choice-title">Try the App</div>
+    <div class="choice-description">
+        Jump right in with a demo account. Perfect for exploring features without commitment.
+    </div>
+</div>
+"""
+
+_SIGNUP_CARD_HTML = """
+<div class="choice-card signup-card">
+    <div class="choice-icon">👤</div>
+    <div class="choice-title">Create Account</div>
+    <div class="choice-description">
+        Sign up to save your progress, sync across devices, and unlock all features.
+    </div>
+</div>
+"""
+
+_ANDROID_HINT_HTML = """
+<div style="
+    background: linear-gradient(135deg, #e8f2ff 0%, #f0f4ff 100%);
+    border: 1px solid #667eea;
+    border-radius: 12px;
+    padding: 1rem;
+    margin: 2rem 0;
+    text-align: center;
+">
+    <p style="margin: 0; color: #4b5563; font-size: 0.9rem;">
+        📱 <strong>Install on Android:</strong> Tap the menu button (⋮) in your browser and select "Add to Home screen" or "Install app"
+    </p>
+</div>
+"""
+
+_FEATURES_HTML = """
+<div class="features-section feature-grid">
+    <div class="feature-item">
+        <strong>📄 PDF Processing</strong>
+        <ul>
+            <li>Upload any PDF document</li>
+            <li>Extract text with OCR support</li>
+            <li>Handle large files up to 200MB</li>
+        </ul>
+    </div>
+    <div class="feature-item">
+        <strong>🎯 Smart Study Tools</strong>
+        <ul>
+            <li>Auto-generate flashcards</li>
+            <li>Create quiz questions</li>
+            <li>Track your progress</li>
+        </ul>
+    </div>
+    <div class="feature-item">
+        <strong>🏆 Gamification</strong>
+        <ul>
+            <li>Earn XP and level up</li>
+            <li>Unlock badges and achievements</li>
+            <li>Build study streaks</li>
+        </ul>
+    </div>
+</div>
+"""
+
+
+def _decode_digest(stored: str) -> bytes:
+    """Decode a stored base64 scrypt digest; malformed values raise ValueError"""
+    return base64.b64decode(stored, validate=True)
+
+
+class _SaltPool:
+    """Hands out salts sliced from a pre-drawn block of random bytes"""
+    
+    def __init__(self, chunk: int = 4096):
+        self._chunk = chunk
+        self._buf = b''
+        self._off = 0
+        self._lock = threading.Lock()
+    
+    def get(self, n: int = 16) -> str:
+        """Return n random bytes as a hex string, refilling the pool when exhausted"""
+        with self._lock:
+            if self._off + n > len(self._buf):
+                self._buf = _token_bytes(max(self._chunk, n))
+                self._off = 0
+            salt = self._buf[self._off:self._off + n]
+            self._off += n
+        return salt.hex()
+
+
+_SALT_POOL = _SaltPool()
+
+# Session keys cleared on logout, interned so session_state lookups hit the pointer-compare path
+_LOGOUT_KEYS = frozenset(sys.intern(key) for key in (
+    'user_id', 'user_email', 'user_name', 'current_document',
+    'flashcards', 'questions', 'selected_chunks', 'pdf_text',
+    'user_avatar', 'authenticated',
+))
+
+# Current password KDF; hashes are stored as 'scrypt$n=...,r=...,p=...$<base64>'
+_SCRYPT_N = 2 ** 15
+_SCRYPT_R = 8
+_SCRYPT_P = 1
+_SCRYPT_PREFIX = f"scrypt$n={_SCRYPT_N},r={_SCRYPT_R},p={_SCRYPT_P}$"
+_SCRYPT_MAXMEM = 64 * 1024 * 1024  # n=2**15, r=8 needs 32 MiB, just past OpenSSL's default cap
+
+# Concurrent scrypt calls in hash_password_batch; each holds 32 MiB inside the server process
+_HASH_BATCH_WORKERS = 2
+
+# Longest password accepted at registration, and the longest login_user will spend a KDF call on
+_MAX_PASSWORD_LENGTH = 1024
+
+# Salt for the throwaway hash computed when a login email is unknown
+_DUMMY_SALT = '00' * 16
+
+
+def _clear_avatar_customizer_state():
+    """Drop the session_state keys registered by the avatar customizer"""
+    for key in st.session_state.pop('_avatar_customizer_keys', ()):
+        st.session_state.pop(key, None)
+
+
+@lru_cache(maxsize=256)
+def _sidebar_user_label(name: str) -> str:
+    """Sidebar heading for the signed-in user"""
+    return f"**👤 {name}**"
+
+
+@st.cache_resource(show_spinner=False)
+def _get_demo_user(_db_manager):
+    """Resolve the shared demo account once per process"""
+    return _db_manager.get_or_create_user(email="demo@studygen.app", name="Demo User")
+
 
 class AuthManager:
     """Handles user authentication and session management"""
     
     def __init__(self, db_manager):
         self.db_manager = db_manager
-        self.avatar_generator = FixedAvatarGenerator()
+    
+    @cached_property
+    def avatar_generator(self):
+        """Avatar generator, built on first use (only registration/demo flows need it)"""
+        from utils.avatar_system_fixed import get_fixed_avatar_generator
+        return get_fixed_avatar_generator()
     
     def hash_password(self, password: str, salt: str = None) -> tuple:
-        """Hash password with salt"""
+        """Hash password with salt using scrypt"""
+        if len(password) > _MAX_PASSWORD_LENGTH:
+            raise ValueError(f"Password must be at most {_MAX_PASSWORD_LENGTH} characters")
         if salt is None:
-            salt = secrets.token_hex(32)
-        
-        # Combine password and salt
-        salted_password = password + salt
+            salt = _SALT_POOL.get()
         
-        # Hash the salted password
-        hashed = hashlib.sha256(salted_password.encode()).hexdigest()
+        # scrypt runs entirely inside OpenSSL; the salt is stored hex-encoded
+        derived = _scrypt(password.encode(), salt=bytes.fromhex(salt),
+                          n=_SCRYPT_N, r=_SCRYPT_R, p=_SCRYPT_P, dklen=32, maxmem=_SCRYPT_MAXMEM)
+        hashed = _SCRYPT_PREFIX + base64.b64encode(derived).decode('ascii')
         
         return hashed, salt
     
+    def hash_password_batch(self, credentials: list, max_workers: int = _HASH_BATCH_WORKERS) -> list:
+        """Hash many (password, salt) pairs in parallel for bulk imports
+        
+        hashlib.scrypt releases the GIL, so worker threads hash concurrently.
+        A salt of None draws a fresh one. Results keep the input order.
+        Workers are capped at _HASH_BATCH_WORKERS to bound scrypt's memory use.
+        """
+        with ThreadPoolExecutor(max_workers=min(max_workers, _HASH_BATCH_WORKERS)) as executor:
+            return list(executor.map(lambda pair: self.hash_password(*pair), credentials))
+    
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Check whether a stored hash is legacy SHA-256 or scrypt with outdated parameters"""
+        return not hashed_password.startswith(_SCRYPT_PREFIX)
+    
     def verify_password(self, password: str, hashed_password: str, salt: str) -> bool:
         """Verify password against hash"""
-        new_hash, _ = self.hash_password(password, salt)
-        return new_hash == hashed_password
+        password_bytes = password.encode('utf-8')
+        try:
+            if hashed_password.startswith('scrypt$'):
+                _, params, stored = hashed_password.split('$')
+                params = dict(param.split('=') for param in params.split(','))
+                expected = _decode_digest(stored)
+                new_hash = _scrypt(password_bytes, salt=bytes.fromhex(salt),
+                                   n=int(params['n']), r=int(params['r']), p=int(params['p']),
+                                   dklen=len(expected), maxmem=_SCRYPT_MAXMEM)
+            else:
+                # Legacy accounts hashed with a single SHA-256 round over password + salt
+                expected = bytes.fromhex(hashed_password)
+                hasher = _sha256(password_bytes)
+                hasher.update(salt.encode('ascii'))
+                new_hash = hasher.digest()
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # Malformed or missing stored hash
+            return False
+        return hmac.compare_digest(new_hash, expected)
     
-    def register_user(self, email: str, password: str, name: str) -> dict:
+    def register_user(self, email: str, password: str, name: str,
+                      avatar_config: dict = None, preferences: dict = None) -> dict:
         """Register a new user"""
+        # login_user rejects longer passwords, so such an account could never sign in
+        if len(password) > _MAX_PASSWORD_LENGTH:
+            return {'success': False, 'error': f"Password must be at most {_MAX_PASSWORD_LENGTH} characters"}
+        
         try:
-            # Check if user already exists
-            existing_user = self.db_manager.get_user_by_email(email)
-            if existing_user:
-                return {'success': False, 'error': 'User already exists'}
-            
             # Hash the password
             hashed_password, salt = self.hash_password(password)
             
@@ -47,10 +580,14 @@ class AuthManager:
                 'name': name,
                 'password_hash': hashed_password,
                 'salt': salt,
-                'preferences': {'study_mode': 'flashcards', 'auto_reveal': False}
+                'avatar_config': avatar_config or {},
+                'preferences': preferences or {'study_mode': 'flashcards', 'auto_reveal': False}
             }
             
+            # The insert skips existing emails, so the uniqueness check is atomic
             user = self.db_manager.create_user_with_password(user_data)
+            if user is None:
+                return {'success': False, 'error': 'User already exists'}
             
             return {'success': True, 'user': user}
             
@@ -59,74 +596,90 @@ class AuthManager:
     
     def login_user(self, email: str, password: str) -> dict:
         """Authenticate user login"""
+        # Registration caps passwords at the same length, so empty or oversized ones can never match
+        if not 1 <= len(password) <= _MAX_PASSWORD_LENGTH:
+            return {'success': False, 'error': 'Invalid email or password'}
+        
+        # Get user from database
         try:
-            # Get user from database
             user = self.db_manager.get_user_by_email(email)
-            if not user:
-                return {'success': False, 'error': 'Invalid email or password'}
-            
-            # Verify password
-            if not self.verify_password(password, user['password_hash'], user['salt']):
-                return {'success': False, 'error': 'Invalid email or password'}
-            
-            # Update last login
-            self.db_manager.update_user_last_active(user['id'])
-            
-            return {'success': True, 'user': user}
-            
-        except Exception as e:
+        except SQLAlchemyError as e:
             return {'success': False, 'error': str(e)}
+        
+        # Unknown emails and password-less demo/Google accounts have nothing to verify against
+        if not user or not user.get('password_hash') or not user.get('salt'):
+            return self._failed_login(password)
+        
+        # Verify password
+        if not self.verify_password(password, user['password_hash'], user['salt']):
+            if self.needs_rehash(user['password_hash']):
+                # Legacy hashes check in microseconds, so pad up to a current scrypt call
+                return self._failed_login(password)
+            return {'success': False, 'error': 'Invalid email or password'}
+        
+        # Upgrade hashes from older schemes now that we have the plaintext
+        if self.needs_rehash(user['password_hash']):
+            password_hash, salt = self.hash_password(password)
+            try:
+                self.db_manager.update_user_password(user['id'], password_hash, salt)
+            except SQLAlchemyError:
+                pass
+        
+        # Update last login in the background so the response doesn't wait on the write
+        threading.Thread(target=self._touch_last_active, args=(user['id'],), daemon=True).start()
+        
+        return {'success': True, 'user': user}
+    
+    def _failed_login(self, password: str) -> dict:
+        """Spend one current-parameter KDF call, then report a failed login
+        
+        Every failure path costs the same scrypt time as checking a current hash,
+        so response time doesn't reveal whether an email exists or how it's stored.
+        """
+        self.hash_password(password, _DUMMY_SALT)
+        return {'success': False, 'error': 'Invalid email or password'}
+    
+    def _touch_last_active(self, user_id):
+        """Record the login time; a failed timestamp write shouldn't block the login"""
+        try:
+            self.db_manager.update_user_last_active(user_id)
+        except SQLAlchemyError:
+            pass
     
     def logout_user(self):
         """Clear user session and redirect to welcome"""
-        session_keys = ['user_id', 'user_email', 'user_name', 'current_document', 
-                       'flashcards', 'questions', 'selected_chunks', 'pdf_text']
-        
-        for key in session_keys:
-            if key in st.session_state:
-                del st.session_state[key]
+        for key in _LOGOUT_KEYS & st.session_state.keys():
+            del st.session_state[key]
         
         # Redirect to welcome page after logout
         st.session_state.current_page = 'welcome'
     
     def is_authenticated(self) -> bool:
         """Check if user is currently authenticated"""
-        return 'user_id' in st.session_state and st.session_state.user_id is not None
+        return st.session_state.get('user_id') is not None
     
     def get_current_user(self) -> dict:
         """Get current authenticated user info"""
-        if not self.is_authenticated():
+        user_id = st.session_state.get('user_id')
+        if user_id is None:
             return None
         
         return {
-            'id': st.session_state.user_id,
+            'id': user_id,
             'email': st.session_state.get('user_email', ''),
             'name': st.session_state.get('user_name', '')
         }
     
     def require_auth(self):
         """Redirect to login if not authenticated"""
-        if not self.is_authenticated():
+        if st.session_state.get('user_id') is None:
             st.session_state.current_page = "🔐 Login"
             st.rerun()
     
     def render_login_page(self):
         """Render the gamified login/register interface"""
         # Header with animation
-        st.markdown("""
-        <div style="text-align: center; padding: 2rem 0;">
-            <h1 style="
-                background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-                -webkit-background-clip: text;
-                -webkit-text-fill-color: transparent;
-                font-size: 3rem;
-                margin-bottom: 0.5rem;
-            ">🎓 StudyGen</h1>
-            <p style="font-size: 1.2rem; color: #666; margin: 0;">
-                Level up your learning with AI-powered study materials!
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_LOGIN_HEADER_HTML, unsafe_allow_html=True)
         
         # Back to welcome button
         if st.button("← Back to Welcome", key="back_to_welcome_btn"):
@@ -137,16 +690,18 @@ class AuthManager:
         if 'registration_step' not in st.session_state:
             st.session_state.registration_step = 'login'
         
-        if st.session_state.registration_step == 'avatar_creation':
-            self._render_avatar_creation()
-        else:
-            login_tab, register_tab = st.tabs(["🚀 Login", "✨ Create Account"])
-            
-            with login_tab:
-                self._render_login_form()
-            
-            with register_tab:
-                self._render_register_form()
+        handler = _STEP_HANDLERS.get(st.session_state.registration_step, AuthManager._render_tabbed_forms)
+        handler(self)
+    
+    def _render_tabbed_forms(self):
+        """Render the login and register tabs"""
+        login_tab, register_tab = st.tabs(["🚀 Login", "✨ Create Account"])
+        
+        with login_tab:
+            self._render_login_form()
+        
+        with register_tab:
+            self._render_register_form()
     
     def _render_login_form(self):
         """Render login form"""
@@ -172,13 +727,15 @@ class AuthManager:
                     if result['success']:
                         # Set session state
                         user = result['user']
-                        st.session_state.user_id = user['id']
-                        st.session_state.user_email = user['email']
-                        st.session_state.user_name = user['name']
-                        st.session_state.user_avatar = user.get('avatar_config', {})
+                        st.session_state.update({
+                            'user_id': user['id'],
+                            'user_email': user['email'],
+                            'user_name': user['name'],
+                            'user_avatar': user.get('avatar_config', {}),
+                            'current_page': "home"
+                        })
                         
                         st.success(f"Welcome back, {user['name']}!")
-                        st.session_state.current_page = "home"
                         st.rerun()
                     else:
                         st.error(f"Login failed: {result['error']}")
@@ -192,15 +749,14 @@ class AuthManager:
         with col2:
             if st.button("📋 Continue as Demo User", use_container_width=True):
                 # Create demo user session
-                demo_user = self.db_manager.get_or_create_user(
-                    email="demo@studygen.app",
-                    name="Demo User"
-                )
-                st.session_state.user_id = demo_user['id']
-                st.session_state.user_email = demo_user['email']
-                st.session_state.user_name = demo_user['name']
-                st.session_state.user_avatar = demo_user.get('avatar_config', {})
-                st.session_state.current_page = "home"
+                demo_user = _get_demo_user(self.db_manager)
+                st.session_state.update({
+                    'user_id': demo_user['id'],
+                    'user_email': demo_user['email'],
+                    'user_name': demo_user['name'],
+                    'user_avatar': demo_user.get('avatar_config', {}),
+                    'current_page': "home"
+                })
                 st.rerun()
     
     def _render_register_form(self):
@@ -211,18 +767,15 @@ class AuthManager:
         with st.form("register_form"):
             name = st.text_input("🏷️ Choose Your Study Name", placeholder="What should we call you?")
             email = st.text_input("📧 Email Address", placeholder="your.email@example.com")
-            password = st.text_input("🔒 Create Password", type="password", help="Make it strong to protect your progress!")
-            confirm_password = st.text_input("🔒 Confirm Password", type="password")
+            # Widgets inside a form can't take on_change callbacks, so state the rules up front
+            # and let the browser cap the length; the checks below still run on submit
+            password = st.text_input("🔒 Create Password", type="password", max_chars=_MAX_PASSWORD_LENGTH,
+                                     help="At least 6 characters. Make it strong to protect your progress!")
+            confirm_password = st.text_input("🔒 Confirm Password", type="password", max_chars=_MAX_PASSWORD_LENGTH,
+                                             help="Must match the password above")
             
             # Add some gamification preview
-            st.markdown("### 🎮 What You'll Get:")
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.markdown("🏆 **Badges & Achievements**")
-            with col2:
-                st.markdown("📊 **Progress Tracking**")
-            with col3:
-                st.markdown("🎨 **Custom Avatar**")
+            st.markdown(_WHAT_YOU_GET_HTML, unsafe_allow_html=True)
             
             col1, col2, col3 = st.columns([1, 2, 1])
             with col2:
@@ -253,80 +806,23 @@ class AuthManager:
 
     def _render_avatar_creation(self):
         """Render avatar creation interface for new users"""
-        # Add CSS for step transitions
-        st.markdown("""
-        <style>
-        .avatar-creation-step {
-            animation: stepFadeIn 0.6s ease-in-out;
-            transition: all 0.3s ease;
-        }
-        
-        .step-header {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 1.5rem;
-            border-radius: 15px;
-            text-align: center;
-            animation: headerSlideIn 0.8s ease-out;
-            margin-bottom: 1.5rem;
-            box-shadow: 0 4px 15px rgba(102, 126, 234, 0.3);
-        }
-        
-        .step-description {
-            background: linear-gradient(135deg, #e3f2fd 0%, #f3e5f5 100%);
-            padding: 1rem;
-            border-radius: 10px;
-            text-align: center;
-            color: #4a5568;
-            margin-bottom: 2rem;
-            animation: descriptionFadeIn 1s ease-in-out;
-            border-left: 4px solid #667eea;
-        }
-        
-        .action-buttons {
-            animation: buttonsSlideUp 1.2s ease-out;
-        }
-        
-        @keyframes stepFadeIn {
-            from { opacity: 0; transform: translateY(20px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        
-        @keyframes headerSlideIn {
-            from { opacity: 0; transform: scale(0.9) translateY(-10px); }
-            to { opacity: 1; transform: scale(1) translateY(0); }
-        }
-        
-        @keyframes descriptionFadeIn {
-            from { opacity: 0; transform: translateX(-10px); }
-            to { opacity: 1; transform: translateX(0); }
-        }
-        
-        @keyframes buttonsSlideUp {
-            from { opacity: 0; transform: translateY(20px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        </style>
-        """, unsafe_allow_html=True)
-        
-        st.markdown('<div class="avatar-creation-step">', unsafe_allow_html=True)
-        st.markdown('<div class="step-header"><h1 style="margin: 0;">🎨 Create Your Avatar!</h1></div>', unsafe_allow_html=True)
-        st.markdown('<div class="step-description">🌟 Design your unique study companion to represent you in StudyGen! This avatar will appear throughout your learning journey.</div>', unsafe_allow_html=True)
+        # Step CSS and header in a single delta
+        st.markdown(_AVATAR_STEP_HTML, unsafe_allow_html=True)
         
         # Initialize avatar config if not exists
         if 'temp_avatar_config' not in st.session_state:
             st.session_state.temp_avatar_config = self.avatar_generator.generate_random_avatar()
         
-        # Clear any existing avatar customizer state to prevent conflicts
-        keys_to_clear = [key for key in st.session_state.keys() if 'avatar_customizer' in key]
-        for key in keys_to_clear:
-            del st.session_state[key]
+        # Render avatar customizer with live preview; its state is cleared when the step ends
+        # or a new random avatar replaces the config, not on every rerun, so applied
+        # selections survive. Completing submits the form, so unapplied selections count too
+        new_config, completed = self.avatar_generator.render_avatar_customizer_with_live_update(
+            st.session_state.temp_avatar_config, save_label="🚀 Complete Registration"
+        )
         
-        # Render avatar customizer with live preview
-        new_config = self.avatar_generator.render_avatar_customizer(st.session_state.temp_avatar_config)
-        
-        # Update the temp config
-        st.session_state.temp_avatar_config = new_config
+        # Only write back when the customizer actually changed something
+        if new_config != st.session_state.temp_avatar_config:
+            st.session_state.temp_avatar_config = new_config
         
         st.markdown("---")
         
@@ -337,350 +833,73 @@ class AuthManager:
         with col1:
             if st.button("⬅️ Back to Registration", use_container_width=True):
                 st.session_state.registration_step = 'login'
-                if 'pending_registration' in st.session_state:
-                    del st.session_state.pending_registration
-                if 'temp_avatar_config' in st.session_state:
-                    del st.session_state.temp_avatar_config
+                st.session_state.pop('pending_registration', None)
+                st.session_state.pop('temp_avatar_config', None)
                 # Clear avatar customizer state
-                keys_to_clear = [key for key in st.session_state.keys() if 'avatar_customizer' in key]
-                for key in keys_to_clear:
-                    del st.session_state[key]
+                _clear_avatar_customizer_state()
                 st.rerun()
         
         with col2:
-            if st.button("🚀 Complete Registration", use_container_width=True, type="primary"):
+            if completed:
                 if 'pending_registration' in st.session_state:
                     # Get registration data
                     reg_data = st.session_state.pending_registration
                     
                     with st.spinner("Creating your account and avatar..."):
-                        # Hash password
-                        password_hash, salt = self.hash_password(reg_data['password'])
-                        
                         # Create user with avatar
-                        try:
-                            user_data = {
-                                'email': reg_data['email'],
-                                'name': reg_data['name'],
-                                'password_hash': password_hash,
-                                'salt': salt,
-                                'avatar_config': st.session_state.temp_avatar_config
-                            }
+                        result = self.register_user(
+                            reg_data['email'],
+                            reg_data['password'],
+                            reg_data['name'],
+                            avatar_config=st.session_state.temp_avatar_config
+                        )
+                        
+                        if result['success']:
+                            # Login the user
+                            user = result['user']
+                            st.session_state.update({
+                                'user_id': user['id'],
+                                'user_email': user['email'],
+                                'user_name': user['name'],
+                                'user_avatar': user['avatar_config']
+                            })
                             
-                            user = self.db_manager.create_user_with_password(user_data)
+                            # Clear temporary data
+                            st.session_state.pop('pending_registration', None)
+                            st.session_state.pop('temp_avatar_config', None)
+                            # Clear avatar customizer state
+                            _clear_avatar_customizer_state()
+                            st.session_state.registration_step = 'login'
                             
-                            if user:
-                                # Login the user
-                                st.session_state.user_id = user['id']
-                                st.session_state.user_email = user['email']
-                                st.session_state.user_name = user['name']
-                                st.session_state.user_avatar = user['avatar_config']
-                                
-                                # Clear temporary data
-                                del st.session_state.pending_registration
-                                del st.session_state.temp_avatar_config
-                                # Clear avatar customizer state
-                                keys_to_clear = [key for key in st.session_state.keys() if 'avatar_customizer' in key]
-                                for key in keys_to_clear:
-                                    del st.session_state[key]
-                                st.session_state.registration_step = 'login'
-                                
-                                # Show success and redirect
-                                st.success("🎉 Welcome to StudyGen! Your avatar looks amazing!")
-                                st.balloons()
-                                st.session_state.current_page = "home"
-                                st.rerun()
-                            else:
-                                st.error("Failed to create account. Please try again.")
-                        except Exception as e:
-                            st.error(f"Registration failed: {str(e)}")
+                            # Show success and redirect
+                            st.success("🎉 Welcome to StudyGen! Your avatar looks amazing!")
+                            st.balloons()
+                            st.session_state.current_page = "home"
+                            st.rerun()
+                        else:
+                            st.error(f"Registration failed: {result['error']}")
         
         with col3:
             if st.button("🎲 New Random Avatar", use_container_width=True):
-                with st.spinner('Generating new avatar...'):
-                    import time
-                    time.sleep(0.2)  # Brief animation pause
-                    st.session_state.temp_avatar_config = self.avatar_generator.generate_random_avatar()
-                    # Clear avatar customizer state
-                    keys_to_clear = [key for key in st.session_state.keys() if 'avatar_customizer' in key]
-                    for key in keys_to_clear:
-                        del st.session_state[key]
+                # Drop the selectbox state so the customizer starts from the new config;
+                # the stepFadeIn animation covers the transition client-side
+                st.session_state.temp_avatar_config = self.avatar_generator.generate_random_avatar()
+                _clear_avatar_customizer_state()
                 st.rerun()
         
-        st.markdown('</div>', unsafe_allow_html=True)  # Close action-buttons div
-        st.markdown('</div>', unsafe_allow_html=True)  # Close avatar-creation-step div
+        st.markdown('</div></div>', unsafe_allow_html=True)  # Close action-buttons and avatar-creation-step divs
     
     def render_welcome_page(self):
         """Render welcome page with option to try app or create account"""
         
         # Apply custom CSS for welcome page with animations
-        st.markdown("""
-        <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-        
-        /* Welcome page animations */
-        @keyframes fadeInUp {
-            from {
-                opacity: 0;
-                transform: translateY(30px);
-            }
-            to {
-                opacity: 1;
-                transform: translateY(0);
-            }
-        }
-        
-        @keyframes slideInLeft {
-            from {
-                opacity: 0;
-                transform: translateX(-50px);
-            }
-            to {
-                opacity: 1;
-                transform: translateX(0);
-            }
-        }
-        
-        @keyframes slideInRight {
-            from {
-                opacity: 0;
-                transform: translateX(50px);
-            }
-            to {
-                opacity: 1;
-                transform: translateX(0);
-            }
-        }
-        
-        @keyframes bounceIn {
-            0% {
-                opacity: 0;
-                transform: scale(0.8);
-            }
-            50% {
-                opacity: 0.8;
-                transform: scale(1.05);
-            }
-            100% {
-                opacity: 1;
-                transform: scale(1);
-            }
-        }
-        
-        @keyframes pulse {
-            0%, 100% {
-                transform: scale(1);
-            }
-            50% {
-                transform: scale(1.02);
-            }
-        }
-        
-        @keyframes gradientShift {
-            0% {
-                background-position: 0% 50%;
-            }
-            50% {
-                background-position: 100% 50%;
-            }
-            100% {
-                background-position: 0% 50%;
-            }
-        }
-        
-        .welcome-container {
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 3rem;
-            text-align: center;
-            font-family: 'Inter', sans-serif;
-        }
-        
-        .welcome-header {
-            margin-bottom: 3rem;
-            animation: fadeInUp 1s ease-out;
-        }
-        
-        .welcome-header h1 {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 50%, #667eea 100%);
-            background-size: 200% 200%;
-            animation: gradientShift 3s ease-in-out infinite;
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-            font-size: 3rem;
-            margin-bottom: 1rem;
-            font-weight: 700;
-            text-shadow: 0 4px 8px rgba(102, 126, 234, 0.3);
-        }
-        
-        .welcome-header p {
-            color: #6b7280;
-            font-size: 1.2rem;
-            max-width: 600px;
-            margin: 0 auto;
-            line-height: 1.6;
-            animation: fadeInUp 1s ease-out 0.3s both;
-        }
-        
-        .choice-card {
-            background: linear-gradient(135deg, #ffffff 0%, #f8f9ff 100%);
-            border-radius: 20px;
-            padding: 2rem;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-            border: 2px solid transparent;
-            transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
-            margin-bottom: 1.5rem;
-            position: relative;
-            overflow: hidden;
-        }
-        
-        .choice-card::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: -100%;
-            width: 100%;
-            height: 100%;
-            background: linear-gradient(90deg, transparent, rgba(102, 126, 234, 0.1), transparent);
-            transition: left 0.6s ease;
-        }
-        
-        .choice-card:hover::before {
-            left: 100%;
-        }
-        
-        .choice-card:hover {
-            border-color: #667eea;
-            transform: translateY(-8px) scale(1.02);
-            box-shadow: 0 20px 50px rgba(102, 126, 234, 0.25);
-            background: linear-gradient(135deg, #ffffff 0%, #f0f4ff 100%);
-        }
-        
-        .demo-card {
-            animation: slideInLeft 0.8s ease-out 0.6s both;
-        }
-        
-        .signup-card {
-            animation: slideInRight 0.8s ease-out 0.9s both;
-        }
-        
-        .choice-icon {
-            font-size: 3rem;
-            margin-bottom: 1rem;
-            animation: bounceIn 0.6s ease-out 1.2s both;
-            display: inline-block;
-            transition: transform 0.3s ease;
-        }
-        
-        .choice-card:hover .choice-icon {
-            transform: scale(1.2) rotate(5deg);
-            animation: pulse 1s ease-in-out infinite;
-        }
-        
-        .choice-title {
-            font-size: 1.5rem;
-            font-weight: 600;
-            color: #2d3748;
-            margin-bottom: 1rem;
-            animation: fadeInUp 0.6s ease-out 1.4s both;
-        }
-        
-        .choice-description {
-            color: #6b7280;
-            line-height: 1.5;
-            margin-bottom: 1.5rem;
-            animation: fadeInUp 0.6s ease-out 1.6s both;
-        }
-        
-        .features-section {
-            animation: fadeInUp 1s ease-out 1.8s both;
-        }
-        
-        .feature-item {
-            animation: fadeInUp 0.6s ease-out both;
-        }
-        
-        .feature-item:nth-child(1) {
-            animation-delay: 2s;
-        }
-        
-        .feature-item:nth-child(2) {
-            animation-delay: 2.2s;
-        }
-        
-        .feature-item:nth-child(3) {
-            animation-delay: 2.4s;
-        }
-        
-        /* Button animations */
-        .stButton > button {
-            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-            position: relative;
-            overflow: hidden;
-        }
-        
-        .stButton > button::before {
-            content: '';
-            position: absolute;
-            top: 50%;
-            left: 50%;
-            width: 0;
-            height: 0;
-            background: rgba(255, 255, 255, 0.3);
-            border-radius: 50%;
-            transform: translate(-50%, -50%);
-            transition: width 0.6s ease, height 0.6s ease;
-        }
-        
-        .stButton > button:hover::before {
-            width: 300px;
-            height: 300px;
-        }
-        
-        .stButton > button:hover {
-            transform: translateY(-2px) scale(1.05);
-            box-shadow: 0 8px 25px rgba(102, 126, 234, 0.4);
-        }
-        
-        /* Mobile responsiveness */
-        @media (max-width: 768px) {
-            .welcome-header h1 {
-                font-size: 2.5rem;
-            }
-            
-            .choice-card {
-                padding: 1.5rem;
-                margin-bottom: 1rem;
-            }
-            
-            .choice-icon {
-                font-size: 2.5rem;
-            }
-        }
-        </style>
-        """, unsafe_allow_html=True)
+        st.markdown(_WELCOME_CSS, unsafe_allow_html=True)
         
         # Welcome header
-        st.markdown("""
-        <div class="welcome-container">
-            <div class="welcome-header">
-                <h1>🎓 Welcome to StudyGen</h1>
-                <p>Transform any PDF into interactive flashcards and quizzes. Choose how you'd like to get started!</p>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_WELCOME_HEADER_HTML, unsafe_allow_html=True)
         
         # Choice options - Demo first, then create account
-        st.markdown("""
-        <div class="choice-card demo-card">
-            <div class="choice-icon">🚀</div>
-            <div class="choice-title">Try the App</div>
-            <div class="choice-description">
-                Jump right in with a demo account. Perfect for exploring features without commitment.
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_DEMO_CARD_HTML, unsafe_allow_html=True)
         
         if st.button("🚀 Try Demo", use_container_width=True, key="demo_btn"):
             self.create_demo_user()
@@ -689,100 +908,40 @@ class AuthManager:
         
         st.markdown("<br>", unsafe_allow_html=True)
         
-        st.markdown("""
-        <div class="choice-card signup-card">
-            <div class="choice-icon">👤</div>
-            <div class="choice-title">Create Account</div>
-            <div class="choice-description">
-                Sign up to save your progress, sync across devices, and unlock all features.
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_SIGNUP_CARD_HTML, unsafe_allow_html=True)
         
         if st.button("👤 Create Account", use_container_width=True, key="signup_btn"):
             st.session_state.current_page = 'login'
             st.rerun()
         
         # Android installation hint
-        st.markdown("""
-        <div style="
-            background: linear-gradient(135deg, #e8f2ff 0%, #f0f4ff 100%);
-            border: 1px solid #667eea;
-            border-radius: 12px;
-            padding: 1rem;
-            margin: 2rem 0;
-            text-align: center;
-        ">
-            <p style="margin: 0; color: #4b5563; font-size: 0.9rem;">
-                📱 <strong>Install on Android:</strong> Tap the menu button (⋮) in your browser and select "Add to Home screen" or "Install app"
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_ANDROID_HINT_HTML, unsafe_allow_html=True)
         
         # Features preview with animations
         st.markdown("---")
-        st.markdown('<div class="features-section">', unsafe_allow_html=True)
         st.markdown("### ✨ What You Can Do")
-        
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            st.markdown("""
-            <div class="feature-item">
-                <strong>📄 PDF Processing</strong>
-                <ul>
-                    <li>Upload any PDF document</li>
-                    <li>Extract text with OCR support</li>
-                    <li>Handle large files up to 200MB</li>
-                </ul>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown("""
-            <div class="feature-item">
-                <strong>🎯 Smart Study Tools</strong>
-                <ul>
-                    <li>Auto-generate flashcards</li>
-                    <li>Create quiz questions</li>
-                    <li>Track your progress</li>
-                </ul>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with col3:
-            st.markdown("""
-            <div class="feature-item">
-                <strong>🏆 Gamification</strong>
-                <ul>
-                    <li>Earn XP and level up</li>
-                    <li>Unlock badges and achievements</li>
-                    <li>Build study streaks</li>
-                </ul>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        st.markdown('</div>', unsafe_allow_html=True)
+        st.markdown(_FEATURES_HTML, unsafe_allow_html=True)
+    
+    @staticmethod
+    def refresh_demo_user():
+        """Drop the cached demo account so the next demo entry re-resolves it"""
+        _get_demo_user.clear()
     
     def create_demo_user(self):
         """Create a demo user for trying the app"""
         try:
             # Create or get demo user
             db = st.session_state.db_manager
-            user_data = db.get_or_create_user(
-                email="demo@studygen.app", 
-                name="Demo User"
-            )
+            user_data = _get_demo_user(db)
             
-            # Set session state
-            st.session_state.user_id = user_data['id']
-            st.session_state.user_email = user_data['email']
-            st.session_state.user_name = user_data['name']
-            st.session_state.authenticated = True
-            
-            # Generate random avatar for demo user
-            avatar_config = self.avatar_generator.generate_random_avatar()
-            st.session_state.user_avatar = avatar_config
+            # Set session state, with a random avatar for the demo user
+            st.session_state.update({
+                'user_id': user_data['id'],
+                'user_email': user_data['email'],
+                'user_name': user_data['name'],
+                'user_avatar': self.avatar_generator.generate_random_avatar(),
+                'authenticated': True
+            })
             
             st.success("Welcome to StudyGen! You're now using a demo account.")
             
@@ -799,10 +958,24 @@ class AuthManager:
         
         with st.sidebar:
             st.markdown("---")
-            st.markdown(f"**👤 {user['name']}**")
+            st.markdown(_sidebar_user_label(user['name']))
             st.caption(user['email'])
             
             if st.button("🚪 Logout", use_container_width=True):
                 self.logout_user()
                 st.session_state.current_page = "🔐 Login"
-                st.rerun()
\ No newline at end of file
+                st.rerun()
+
+
+# Initialize auth manager
+@st.cache_resource
+def get_auth_manager(_db_manager):
+    """Shared AuthManager, kept alive across reruns and sessions"""
+    return AuthManager(_db_manager)
+
+
+# Registration step -> page renderer; unknown steps fall back to the login tabs
+_STEP_HANDLERS = {
+    'login': AuthManager._render_tabbed_forms,
+    'avatar_creation': AuthManager._render_avatar_creation,
+}
@@ -1,90 +1,116 @@
 import streamlit as st
 import random
-import json
+from bisect import bisect_right
+from functools import lru_cache
+from string import Template
 from typing import Dict, List
+from urllib.parse import quote
 
 class AvatarGenerator:
     """Generate customizable avatars for user profiles"""
     
-    def __init__(self):
-        self.avatar_options = {
-            'skin_tones': {
-                'Light Peach': '#F5DEB3',
-                'Medium Beige': '#DEB887', 
-                'Warm Tan': '#D2B48C',
-                'Golden Brown': '#CD853F',
-                'Rich Brown': '#8B4513',
-                'Deep Brown': '#654321'
-            },
-            'hair_colors': {
-                'Dark Brown': '#2C1B18',
-                'Chestnut': '#8B4513',
-                'Golden Blonde': '#D4AF37',
-                'Auburn Red': '#B22222',
-                'Jet Black': '#000000',
-                'Silver Gray': '#696969'
-            },
-            'hair_styles': {
-                'Short & Neat': 'short',
-                'Medium Length': 'medium',
-                'Long & Flowing': 'long',
-                'Curly & Fun': 'curly',
-                'Bald & Bold': 'bald',
-                'Stylish Ponytail': 'ponytail'
-            },
-            'eye_colors': {
-                'Bright Blue': '#4169E1',
-                'Warm Brown': '#8B4513',
-                'Forest Green': '#228B22',
-                'Emerald Green': '#32CD32',
-                'Steel Gray': '#808080',
-                'Deep Black': '#000000'
-            },
-            'accessories': {
-                'None': 'none',
-                'Classic Glasses': 'glasses',
-                'Stylish Hat': 'hat',
-                'Pretty Earrings': 'earrings',
-                'Elegant Necklace': 'necklace',
-                'Cool Cap': 'cap'
-            },
-            'expressions': {
-                'Happy Smile': 'smile',
-                'Calm & Neutral': 'neutral',
-                'Joyful & Bright': 'happy',
-                'Cool & Confident': 'cool',
-                'Playful Wink': 'wink',
-                'Laughing': 'laugh'
-            }
-        }
+    # Session-state keys owned by render_avatar_customizer, as suffixes of the customizer key
+    _CUSTOMIZER_KEY_SUFFIXES = ('config', 'skin', 'hair_style', 'hair_color', 'eyes',
+                                'expression', 'accessory', 'random')
     
-    def generate_random_avatar(self) -> Dict:
-        """Generate a random avatar configuration"""
-        return {
-            'skin_tone': random.choice(list(self.avatar_options['skin_tones'].values())),
-            'hair_color': random.choice(list(self.avatar_options['hair_colors'].values())),
-            'hair_style': random.choice(list(self.avatar_options['hair_styles'].values())),
-            'eye_color': random.choice(list(self.avatar_options['eye_colors'].values())),
-            'accessory': random.choice(list(self.avatar_options['accessories'].values())),
-            'expression': random.choice(list(self.avatar_options['expressions'].values()))
+    # Option label -> value, shared by all instances
+    avatar_options = {
+        'skin_tones': {
+            'Light Peach': '#F5DEB3',
+            'Medium Beige': '#DEB887', 
+            'Warm Tan': '#D2B48C',
+            'Golden Brown': '#CD853F',
+            'Rich Brown': '#8B4513',
+            'Deep Brown': '#654321'
+        },
+        'hair_colors': {
+            'Dark Brown': '#2C1B18',
+            'Chestnut': '#8B4513',
+            'Golden Blonde': '#D4AF37',
+            'Auburn Red': '#B22222',
+            'Jet Black': '#000000',
+            'Silver Gray': '#696969'
+        },
+        'hair_styles': {
+            'Short & Neat': 'short',
+            'Medium Length': 'medium',
+            'Long & Flowing': 'long',
+            'Curly & Fun': 'curly',
+            'Bald & Bold': 'bald',
+            'Stylish Ponytail': 'ponytail'
+        },
+        'eye_colors': {
+            'Bright Blue': '#4169E1',
+            'Warm Brown': '#8B4513',
+            'Forest Green': '#228B22',
+            'Emerald Green': '#32CD32',
+            'Steel Gray': '#808080',
+            'Deep Black': '#000000'
+        },
+        'accessories': {
+            'None': 'none',
+            'Classic Glasses': 'glasses',
+            'Stylish Hat': 'hat',
+            'Pretty Earrings': 'earrings',
+            'Elegant Necklace': 'necklace',
+            'Cool Cap': 'cap'
+        },
+        'expressions': {
+            'Happy Smile': 'smile',
+            'Calm & Neutral': 'neutral',
+            'Joyful & Bright': 'happy',
+            'Cool & Confident': 'cool',
+            'Playful Wink': 'wink',
+            'Laughing': 'laugh'
         }
+    }
     
-    def render_avatar_svg(self, avatar_config: Dict) -> str:
-        """Generate SVG representation of avatar"""
-        skin_tone = avatar_config.get('skin_tone', '#F5DEB3')
-        hair_color = avatar_config.get('hair_color', '#2C1B18')
-        hair_style = avatar_config.get('hair_style', 'short')
-        eye_color = avatar_config.get('eye_color', '#4169E1')
-        accessory = avatar_config.get('accessory', 'none')
-        expression = avatar_config.get('expression', 'smile')
-        
-        # Enhanced SVG structure with better styling
-        svg = f'''
+    # Selectbox labels per category, in display order
+    _OPTION_NAMES = {category: tuple(options) for category, options in avatar_options.items()}
+    
+    # Option value -> selectbox position, per category
+    _OPTION_INDEX = {
+        category: {value: i for i, value in enumerate(options.values())}
+        for category, options in avatar_options.items()
+    }
+    
+    # (widget key suffix, option category, config field) for each customizer selectbox
+    _CUSTOMIZER_WIDGETS = (
+        ('skin', 'skin_tones', 'skin_tone'),
+        ('hair_style', 'hair_styles', 'hair_style'),
+        ('hair_color', 'hair_colors', 'hair_color'),
+        ('eyes', 'eye_colors', 'eye_color'),
+        ('expression', 'expressions', 'expression'),
+        ('accessory', 'accessories', 'accessory'),
+    )
+    
+    # Config field and the option values it is drawn from, for generate_random_avatar
+    _RANDOM_POOLS = (
+        ('skin_tone', tuple(avatar_options['skin_tones'].values())),
+        ('hair_color', tuple(avatar_options['hair_colors'].values())),
+        ('hair_style', tuple(avatar_options['hair_styles'].values())),
+        ('eye_color', tuple(avatar_options['eye_colors'].values())),
+        ('accessory', tuple(avatar_options['accessories'].values())),
+        ('expression', tuple(avatar_options['expressions'].values())),
+    )
+    
+    # (stat, default, ascending thresholds, unlock per threshold) for get_avatar_achievements
+    _ACHIEVEMENT_TABLES = (
+        ('level', 1, (5, 10, 15),
+         ("🎩 Fancy Hat (Level 5+)", "👑 Crown (Level 10+)", "🕶️ Cool Sunglasses (Level 15+)")),
+        ('current_streak', 0, (7, 30),
+         ("🔥 Fire Hair (7-day streak)", "⚡ Lightning Hair (30-day streak)")),
+        ('badges_count', 0, (5, 10),
+         ("💎 Diamond Earrings (5+ badges)", "🌟 Star Crown (10+ badges)")),
+    )
+    
+    # Whole-avatar SVG; substituted once per distinct config
+    _SVG_TEMPLATE = Template('''
         <svg width="120" height="120" viewBox="0 0 120 120" xmlns="http://www.w3.org/2000/svg">
             <defs>
                 <radialGradient id="faceGradient" cx="0.5" cy="0.3" r="0.7">
-                    <stop offset="0%" style="stop-color:{self._lighten_color(skin_tone)};stop-opacity:1" />
-                    <stop offset="100%" style="stop-color:{skin_tone};stop-opacity:1" />
+                    <stop offset="0%" style="stop-color:$highlight;stop-opacity:1" />
+                    <stop offset="100%" style="stop-color:$skin;stop-opacity:1" />
                 </radialGradient>
                 <filter id="shadow" x="-20%" y="-20%" width="140%" height="140%">
                     <feDropShadow dx="2" dy="3" stdDeviation="3" flood-color="rgba(0,0,0,0.2)"/>
@@ -95,153 +121,283 @@ class AvatarGenerator:
             <circle cx="60" cy="65" r="35" fill="url(#faceGradient)" stroke="#DDD" stroke-width="1.5" filter="url(#shadow)"/>
             
             <!-- Hair -->
-            {self._get_hair_svg(hair_style, hair_color)}
+            $hair
             
             <!-- Eyes -->
             <circle cx="50" cy="58" r="4" fill="white" stroke="#CCC" stroke-width="0.5"/>
             <circle cx="70" cy="58" r="4" fill="white" stroke="#CCC" stroke-width="0.5"/>
-            <circle cx="50" cy="58" r="2.5" fill="{eye_color}"/>
-            <circle cx="70" cy="58" r="2.5" fill="{eye_color}"/>
+            <circle cx="50" cy="58" r="2.5" fill="$eye"/>
+            <circle cx="70" cy="58" r="2.5" fill="$eye"/>
             <circle cx="51" cy="57" r="0.8" fill="white" opacity="0.8"/>
             <circle cx="71" cy="57" r="0.8" fill="white" opacity="0.8"/>
             
             <!-- Eyebrows -->
-            <path d="M 46 54 Q 50 52 54 54" stroke="{self._darken_color(skin_tone)}" stroke-width="1.5" fill="none"/>
-            <path d="M 66 54 Q 70 52 74 54" stroke="{self._darken_color(skin_tone)}" stroke-width="1.5" fill="none"/>
+            <path d="M 46 54 Q 50 52 54 54" stroke="$shade" stroke-width="1.5" fill="none"/>
+            <path d="M 66 54 Q 70 52 74 54" stroke="$shade" stroke-width="1.5" fill="none"/>
             
             <!-- Nose -->
-            <ellipse cx="60" cy="65" rx="1.5" ry="2.5" fill="{self._darken_color(skin_tone)}" opacity="0.6"/>
+            <ellipse cx="60" cy="65" rx="1.5" ry="2.5" fill="$shade" opacity="0.6"/>
             
             <!-- Mouth -->
-            {self._get_mouth_svg(expression)}
+            $mouth
             
             <!-- Accessories -->
-            {self._get_accessory_svg(accessory)}
+            $accessory
         </svg>
-        '''
-        
-        return svg
+        ''')
     
-    def _get_hair_svg(self, style: str, color: str) -> str:
-        """Generate hair SVG based on style"""
-        if style == 'bald':
-            return ''
-        elif style == 'short':
-            return f'<path d="M 30 45 Q 60 25 90 45 Q 85 35 60 30 Q 35 35 30 45" fill="{color}"/>'
-        elif style == 'medium':
-            return f'<path d="M 25 45 Q 60 20 95 45 Q 95 40 90 35 Q 60 25 30 35 Q 25 40 25 45" fill="{color}"/>'
-        elif style == 'long':
-            return f'<path d="M 20 45 Q 60 15 100 45 Q 100 55 95 65 Q 60 20 25 65 Q 20 55 20 45" fill="{color}"/>'
-        elif style == 'curly':
-            return f'''
+    # SVG fragments per option; hair templates take the hair color as {color}
+    _HAIR_TEMPLATES = {
+        'bald': '',
+        'short': '<path d="M 30 45 Q 60 25 90 45 Q 85 35 60 30 Q 35 35 30 45" fill="{color}"/>',
+        'medium': '<path d="M 25 45 Q 60 20 95 45 Q 95 40 90 35 Q 60 25 30 35 Q 25 40 25 45" fill="{color}"/>',
+        'long': '<path d="M 20 45 Q 60 15 100 45 Q 100 55 95 65 Q 60 20 25 65 Q 20 55 20 45" fill="{color}"/>',
+        'curly': '''
             <circle cx="35" cy="40" r="8" fill="{color}"/>
             <circle cx="50" cy="35" r="9" fill="{color}"/>
             <circle cx="65" cy="35" r="9" fill="{color}"/>
             <circle cx="80" cy="40" r="8" fill="{color}"/>
-            '''
-        elif style == 'ponytail':
-            return f'''
+            ''',
+        'ponytail': '''
             <path d="M 30 45 Q 60 25 90 45 Q 85 35 60 30 Q 35 35 30 45" fill="{color}"/>
             <ellipse cx="85" cy="55" rx="6" ry="15" fill="{color}"/>
-            '''
-        else:
-            return f'<path d="M 30 45 Q 60 25 90 45 Q 85 35 60 30 Q 35 35 30 45" fill="{color}"/>'
+            ''',
+    }
     
-    def _get_mouth_svg(self, expression: str) -> str:
-        """Generate mouth SVG based on expression"""
-        if expression == 'smile':
-            return '<path d="M 50 75 Q 60 80 70 75" stroke="#000" stroke-width="2" fill="none"/>'
-        elif expression == 'happy':
-            return '<path d="M 50 75 Q 60 82 70 75" stroke="#000" stroke-width="2" fill="none"/>'
-        elif expression == 'neutral':
-            return '<line x1="52" y1="75" x2="68" y2="75" stroke="#000" stroke-width="2"/>'
-        elif expression == 'cool':
-            return '<path d="M 52 77 Q 60 75 68 77" stroke="#000" stroke-width="2" fill="none"/>'
-        elif expression == 'wink':
-            return '''
+    _MOUTH_SVG = {
+        'smile': '<path d="M 50 75 Q 60 80 70 75" stroke="#000" stroke-width="2" fill="none"/>',
+        'happy': '<path d="M 50 75 Q 60 82 70 75" stroke="#000" stroke-width="2" fill="none"/>',
+        'neutral': '<line x1="52" y1="75" x2="68" y2="75" stroke="#000" stroke-width="2"/>',
+        'cool': '<path d="M 52 77 Q 60 75 68 77" stroke="#000" stroke-width="2" fill="none"/>',
+        'wink': '''
             <path d="M 50 75 Q 60 80 70 75" stroke="#000" stroke-width="2" fill="none"/>
             <path d="M 47 56 L 53 58" stroke="#000" stroke-width="2"/>
-            '''
-        elif expression == 'laugh':
-            return '''
+            ''',
+        'laugh': '''
             <ellipse cx="60" cy="78" rx="8" ry="4" fill="#000"/>
             <ellipse cx="60" cy="78" rx="6" ry="2" fill="#FFF"/>
-            '''
-        else:
-            return '<path d="M 50 75 Q 60 80 70 75" stroke="#000" stroke-width="2" fill="none"/>'
+            ''',
+    }
     
-    def _get_accessory_svg(self, accessory: str) -> str:
-        """Generate accessory SVG"""
-        if accessory == 'glasses':
-            return '''
+    _ACCESSORY_SVG = {
+        'glasses': '''
             <circle cx="50" cy="58" r="8" fill="none" stroke="#000" stroke-width="2"/>
             <circle cx="70" cy="58" r="8" fill="none" stroke="#000" stroke-width="2"/>
             <line x1="58" y1="58" x2="62" y2="58" stroke="#000" stroke-width="2"/>
-            '''
-        elif accessory == 'hat':
-            return '<rect x="35" y="30" width="50" height="8" fill="#4169E1" rx="4"/>'
-        elif accessory == 'cap':
-            return '''
+            ''',
+        'hat': '<rect x="35" y="30" width="50" height="8" fill="#4169E1" rx="4"/>',
+        'cap': '''
             <path d="M 30 40 Q 60 25 90 40 L 95 35 Q 60 20 25 35 Z" fill="#FF4500"/>
             <ellipse cx="95" cy="42" rx="8" ry="3" fill="#FF4500"/>
-            '''
-        elif accessory == 'earrings':
-            return '''
+            ''',
+        'earrings': '''
             <circle cx="35" cy="68" r="2" fill="#FFD700"/>
             <circle cx="85" cy="68" r="2" fill="#FFD700"/>
-            '''
-        elif accessory == 'necklace':
-            return '''
+            ''',
+        'necklace': '''
             <ellipse cx="60" cy="85" rx="15" ry="5" fill="none" stroke="#FFD700" stroke-width="2"/>
             <circle cx="60" cy="90" r="3" fill="#FFD700"/>
-            '''
-        else:
-            return ''
+            ''',
+    }
+    
+    # Customizer styles, sent inline with each render
+    _CUSTOMIZER_CSS = """
+    <style>
+    .avatar-preview-container {
+        text-align: center;
+        padding: 2rem;
+        background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
+        border-radius: 15px;
+        margin-bottom: 1rem;
+        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+        transition: all 0.3s ease-in-out;
+        animation: fadeIn 0.5s ease-in-out;
+    }
+
+    .avatar-preview-container:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 8px 15px rgba(0, 0, 0, 0.15);
+    }
+
+    .avatar-image {
+        transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
+        animation: avatarSlideIn 0.6s ease-out;
+    }
+
+    .avatar-image:hover {
+        transform: scale(1.05);
+    }
+
+    .avatar-preview-text {
+        text-align: center;
+        margin-top: 1rem;
+        font-weight: bold;
+        color: #4a5568;
+        transition: color 0.3s ease;
+        animation: textFadeIn 0.8s ease-in-out;
+    }
+
+    .avatar-preview-text:hover {
+        color: #2d3748;
+    }
+
+    @keyframes fadeIn {
+        from { opacity: 0; transform: translateY(10px); }
+        to { opacity: 1; transform: translateY(0); }
+    }
+
+    @keyframes avatarSlideIn {
+        from {
+            opacity: 0;
+            transform: scale(0.8) rotate(-5deg);
+        }
+        to {
+            opacity: 1;
+            transform: scale(1) rotate(0deg);
+        }
+    }
+
+    @keyframes textFadeIn {
+        from { opacity: 0; transform: translateY(5px); }
+        to { opacity: 1; transform: translateY(0); }
+    }
+
+    .customization-section {
+        animation: slideInFromLeft 0.5s ease-out;
+        transition: all 0.3s ease;
+    }
+
+    .customization-section:hover {
+        transform: translateX(5px);
+    }
+
+    @keyframes slideInFromLeft {
+        from { opacity: 0; transform: translateX(-20px); }
+        to { opacity: 1; transform: translateX(0); }
+    }
+
+    /* Smooth transitions for select boxes */
+    .stSelectbox > div > div {
+        transition: all 0.2s ease !important;
+    }
+
+    .stSelectbox > div > div:hover {
+        transform: translateY(-1px);
+        box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
+    }
+    </style>
+    """
+    
+    def generate_random_avatar(self) -> Dict:
+        """Generate a random avatar configuration"""
+        choice = random.choice
+        return {field: choice(pool) for field, pool in self._RANDOM_POOLS}
+    
+    @staticmethod
+    def _config_key(avatar_config: Dict) -> tuple:
+        """The six rendering fields of a config, with defaults, as a hashable tuple"""
+        return (
+            avatar_config.get('skin_tone', '#F5DEB3'),
+            avatar_config.get('hair_color', '#2C1B18'),
+            avatar_config.get('hair_style', 'short'),
+            avatar_config.get('eye_color', '#4169E1'),
+            avatar_config.get('accessory', 'none'),
+            avatar_config.get('expression', 'smile'),
+        )
+    
+    def render_avatar_svg(self, avatar_config: Dict) -> str:
+        """Generate SVG representation of avatar"""
+        return self._build_svg(*self._config_key(avatar_config))
+    
+    def render_avatar_data_url(self, avatar_config: Dict) -> str:
+        """Avatar SVG as a data: URL for st.image / <img>"""
+        return self._build_data_url(*self._config_key(avatar_config))
+    
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _build_svg(skin_tone: str, hair_color: str, hair_style: str,
+                   eye_color: str, accessory: str, expression: str) -> str:
+        """Build the avatar SVG; output depends only on the six fields, so it's memoized"""
+        return AvatarGenerator._SVG_TEMPLATE.substitute(
+            skin=skin_tone,
+            highlight=AvatarGenerator._lighten_color(skin_tone),
+            shade=AvatarGenerator._darken_color(skin_tone),
+            hair=AvatarGenerator._get_hair_svg(hair_style, hair_color),
+            eye=eye_color,
+            mouth=AvatarGenerator._get_mouth_svg(expression),
+            accessory=AvatarGenerator._get_accessory_svg(accessory),
+        )
+    
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _build_data_url(*fields: str) -> str:
+        """Percent-encoded data URL of _build_svg's output, memoized alongside it"""
+        # SVG is text, so URL-escaping it is smaller than base64; '"' and '#' stay escaped
+        # so the URL is safe inside an <img src="..."> attribute
+        return "data:image/svg+xml;charset=utf-8," + quote(AvatarGenerator._build_svg(*fields), safe=" /:=;,'()<>")
+    
+    @staticmethod
+    def _get_hair_svg(style: str, color: str) -> str:
+        """Generate hair SVG based on style"""
+        return AvatarGenerator._HAIR_TEMPLATES.get(style, AvatarGenerator._HAIR_TEMPLATES['short']).format(color=color)
+    
+    @staticmethod
+    def _get_mouth_svg(expression: str) -> str:
+        """Generate mouth SVG based on expression"""
+        return AvatarGenerator._MOUTH_SVG.get(expression, AvatarGenerator._MOUTH_SVG['smile'])
+    
+    @staticmethod
+    def _get_accessory_svg(accessory: str) -> str:
+        """Generate accessory SVG"""
+        return AvatarGenerator._ACCESSORY_SVG.get(accessory, '')
     
-    def _darken_color(self, color: str) -> str:
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _darken_color(color: str) -> str:
         """Darken a hex color for shading"""
         if color.startswith('#'):
             color = color[1:]
         
-        # Convert hex to RGB
-        r = int(color[0:2], 16)
-        g = int(color[2:4], 16)
-        b = int(color[4:6], 16)
+        # Parse once and darken each channel by 20% in integer math
+        v = int(color[:6], 16)
+        r = (v >> 16) * 4 // 5
+        g = ((v >> 8) & 0xFF) * 4 // 5
+        b = (v & 0xFF) * 4 // 5
         
-        # Darken by 20%
-        r = max(0, int(r * 0.8))
-        g = max(0, int(g * 0.8))
-        b = max(0, int(b * 0.8))
-        
-        return f"#{r:02x}{g:02x}{b:02x}"
+        return f"#{(r << 16) | (g << 8) | b:06x}"
     
-    def _lighten_color(self, color: str) -> str:
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _lighten_color(color: str) -> str:
         """Lighten a hex color for highlights"""
         if color.startswith('#'):
             color = color[1:]
         
-        # Convert hex to RGB
-        r = int(color[0:2], 16)
-        g = int(color[2:4], 16)
-        b = int(color[4:6], 16)
-        
-        # Lighten by 15%
-        r = min(255, int(r * 1.15))
-        g = min(255, int(g * 1.15))
-        b = min(255, int(b * 1.15))
+        # Parse once and lighten each channel by 15%; the float multiply is kept because
+        # c * 23 // 20 rounds differently from int(c * 1.15) for some channel values
+        v = int(color[:6], 16)
+        r = min(255, int((v >> 16) * 1.15))
+        g = min(255, int(((v >> 8) & 0xFF) * 1.15))
+        b = min(255, int((v & 0xFF) * 1.15))
         
-        return f"#{r:02x}{g:02x}{b:02x}"
+        return f"#{(r << 16) | (g << 8) | b:06x}"
     
     def render_avatar_customizer(self, initial_config: Dict[str, str] = None) -> Dict[str, str]:
         """Render avatar customization interface with live preview"""
         if initial_config is None:
             initial_config = self.generate_random_avatar()
         
+        st.markdown(self._CUSTOMIZER_CSS, unsafe_allow_html=True)
         st.markdown("### 🎨 Customize Your Avatar")
         
         # Use a unique key for this customizer instance
         customizer_key = "avatar_customizer"
         
+        # Register the keys we own so callers can clear them without scanning session_state
+        st.session_state.setdefault(f'_{customizer_key}_keys', set()).update(
+            f'{customizer_key}_{suffix}' for suffix in self._CUSTOMIZER_KEY_SUFFIXES
+        )
+        
         # Initialize configuration in session state
         if f'{customizer_key}_config' not in st.session_state:
             st.session_state[f'{customizer_key}_config'] = initial_config.copy()
@@ -249,12 +405,13 @@ class AvatarGenerator:
         # Check if we need to update the preview based on current widget values
         current_config = st.session_state[f'{customizer_key}_config']
         
-        # Helper function to get current selection index
-        def get_selection_index(option_dict, current_value):
-            for i, (name, value) in enumerate(option_dict.items()):
-                if value == current_value:
-                    return i
-            return 0
+        # Selectbox position of the current value, or the first option for unknown values.
+        # Once a widget's key is in session_state that value wins and index= is ignored, so
+        # pass the default 0 to avoid Streamlit's default-plus-Session-State warning
+        def get_selection_index(category, current_value, key):
+            if key in st.session_state:
+                return 0
+            return self._OPTION_INDEX[category].get(current_value, 0)
         
         # Create columns for layout
         col1, col2 = st.columns([2, 1])
@@ -262,69 +419,73 @@ class AvatarGenerator:
         with col1:
             st.markdown("#### Customization Options")
             
-            # Skin tone selection
-            skin_tone_names = list(self.avatar_options['skin_tones'].keys())
-            skin_tone_index = get_selection_index(self.avatar_options['skin_tones'], current_config.get('skin_tone'))
-            selected_skin_name = st.selectbox(
-                "🎨 Skin Tone", 
-                skin_tone_names, 
-                index=skin_tone_index, 
-                key=f"{customizer_key}_skin"
-            )
-            
-            # Hair options
-            col_hair1, col_hair2 = st.columns(2)
-            with col_hair1:
-                hair_style_names = list(self.avatar_options['hair_styles'].keys())
-                hair_style_index = get_selection_index(self.avatar_options['hair_styles'], current_config.get('hair_style'))
-                selected_hair_style = st.selectbox(
-                    "💇 Hair Style", 
-                    hair_style_names, 
-                    index=hair_style_index, 
-                    key=f"{customizer_key}_hair_style"
+            # Selections inside a form only rerun the script when applied
+            with st.form(key=f"{customizer_key}_form"):
+                # Skin tone selection
+                skin_tone_names = self._OPTION_NAMES['skin_tones']
+                skin_tone_index = get_selection_index('skin_tones', current_config.get('skin_tone'), f"{customizer_key}_skin")
+                selected_skin_name = st.selectbox(
+                    "🎨 Skin Tone", 
+                    skin_tone_names, 
+                    index=skin_tone_index, 
+                    key=f"{customizer_key}_skin"
                 )
                 
-            with col_hair2:
-                hair_color_names = list(self.avatar_options['hair_colors'].keys())
-                hair_color_index = get_selection_index(self.avatar_options['hair_colors'], current_config.get('hair_color'))
-                selected_hair_color = st.selectbox(
-                    "🎨 Hair Color", 
-                    hair_color_names, 
-                    index=hair_color_index, 
-                    key=f"{customizer_key}_hair_color"
-                )
-            
-            # Eye color
-            eye_color_names = list(self.avatar_options['eye_colors'].keys())
-            eye_color_index = get_selection_index(self.avatar_options['eye_colors'], current_config.get('eye_color'))
-            selected_eye_color = st.selectbox(
-                "👁️ Eye Color", 
-                eye_color_names, 
-                index=eye_color_index, 
-                key=f"{customizer_key}_eyes"
-            )
-            
-            # Expression and accessories
-            col_exp1, col_exp2 = st.columns(2)
-            with col_exp1:
-                expression_names = list(self.avatar_options['expressions'].keys())
-                expression_index = get_selection_index(self.avatar_options['expressions'], current_config.get('expression'))
-                selected_expression = st.selectbox(
-                    "😊 Expression", 
-                    expression_names, 
-                    index=expression_index, 
-                    key=f"{customizer_key}_expression"
-                )
+                # Hair options
+                col_hair1, col_hair2 = st.columns(2)
+                with col_hair1:
+                    hair_style_names = self._OPTION_NAMES['hair_styles']
+                    hair_style_index = get_selection_index('hair_styles', current_config.get('hair_style'), f"{customizer_key}_hair_style")
+                    selected_hair_style = st.selectbox(
+                        "💇 Hair Style", 
+                        hair_style_names, 
+                        index=hair_style_index, 
+                        key=f"{customizer_key}_hair_style"
+                    )
+                    
+                with col_hair2:
+                    hair_color_names = self._OPTION_NAMES['hair_colors']
+                    hair_color_index = get_selection_index('hair_colors', current_config.get('hair_color'), f"{customizer_key}_hair_color")
+                    selected_hair_color = st.selectbox(
+                        "🎨 Hair Color", 
+                        hair_color_names, 
+                        index=hair_color_index, 
+                        key=f"{customizer_key}_hair_color"
+                    )
                 
-            with col_exp2:
-                accessory_names = list(self.avatar_options['accessories'].keys())
-                accessory_index = get_selection_index(self.avatar_options['accessories'], current_config.get('accessory'))
-                selected_accessory = st.selectbox(
-                    "✨ Accessory", 
-                    accessory_names, 
-                    index=accessory_index, 
-                    key=f"{customizer_key}_accessory"
+                # Eye color
+                eye_color_names = self._OPTION_NAMES['eye_colors']
+                eye_color_index = get_selection_index('eye_colors', current_config.get('eye_color'), f"{customizer_key}_eyes")
+                selected_eye_color = st.selectbox(
+                    "👁️ Eye Color", 
+                    eye_color_names, 
+                    index=eye_color_index, 
+                    key=f"{customizer_key}_eyes"
                 )
+                
+                # Expression and accessories
+                col_exp1, col_exp2 = st.columns(2)
+                with col_exp1:
+                    expression_names = self._OPTION_NAMES['expressions']
+                    expression_index = get_selection_index('expressions', current_config.get('expression'), f"{customizer_key}_expression")
+                    selected_expression = st.selectbox(
+                        "😊 Expression", 
+                        expression_names, 
+                        index=expression_index, 
+                        key=f"{customizer_key}_expression"
+                    )
+                    
+                with col_exp2:
+                    accessory_names = self._OPTION_NAMES['accessories']
+                    accessory_index = get_selection_index('accessories', current_config.get('accessory'), f"{customizer_key}_accessory")
+                    selected_accessory = st.selectbox(
+                        "✨ Accessory", 
+                        accessory_names, 
+                        index=accessory_index, 
+                        key=f"{customizer_key}_accessory"
+                    )
+                
+                st.form_submit_button("✅ Apply Changes", use_container_width=True)
         
         # Build current configuration from widget selections
         current_avatar_config = {
@@ -336,158 +497,55 @@ class AvatarGenerator:
             'accessory': self.avatar_options['accessories'][selected_accessory]
         }
         
-        # Update session state with current selections
-        st.session_state[f'{customizer_key}_config'] = current_avatar_config
+        # Update session state only when a selection actually changed
+        if current_avatar_config != current_config:
+            st.session_state[f'{customizer_key}_config'] = current_avatar_config
         
         with col2:
             st.markdown("#### 👁️ Live Preview")
             
-            # Display avatar using current widget selections
-            avatar_svg = self.render_avatar_svg(current_avatar_config)
-            
-            # Convert SVG to data URL
-            import base64
-            svg_bytes = avatar_svg.encode('utf-8')
-            svg_b64 = base64.b64encode(svg_bytes).decode('utf-8')
-            svg_data_url = f"data:image/svg+xml;base64,{svg_b64}"
+            # Display avatar using current widget selections; the data URL is cached per config
+            svg_data_url = self.render_avatar_data_url(current_avatar_config)
             
             # Display with container
             with st.container():
                 st.image(svg_data_url, width=150)
                 st.caption("Your Avatar Preview")
                 
-                # Random avatar button
-                if st.button("🎲 Random Avatar", use_container_width=True, key=f"{customizer_key}_random"):
-                    with st.spinner('Generating new avatar...'):
-                        import time
-                        time.sleep(0.2)
-                        new_random = self.generate_random_avatar()
-                        st.session_state[f'{customizer_key}_config'] = new_random
-                    st.rerun()
-        
-        # Add CSS for smooth animations once at the top
-        st.markdown("""
-        <style>
-        .avatar-preview-container {
-            text-align: center;
-            padding: 2rem;
-            background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-            border-radius: 15px;
-            margin-bottom: 1rem;
-            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-            transition: all 0.3s ease-in-out;
-            animation: fadeIn 0.5s ease-in-out;
-        }
-        
-        .avatar-preview-container:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 8px 15px rgba(0, 0, 0, 0.15);
-        }
-        
-        .avatar-image {
-            transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
-            animation: avatarSlideIn 0.6s ease-out;
-        }
-        
-        .avatar-image:hover {
-            transform: scale(1.05);
-        }
-        
-        .avatar-preview-text {
-            text-align: center;
-            margin-top: 1rem;
-            font-weight: bold;
-            color: #4a5568;
-            transition: color 0.3s ease;
-            animation: textFadeIn 0.8s ease-in-out;
-        }
-        
-        .avatar-preview-text:hover {
-            color: #2d3748;
-        }
-        
-        @keyframes fadeIn {
-            from { opacity: 0; transform: translateY(10px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        
-        @keyframes avatarSlideIn {
-            from { 
-                opacity: 0; 
-                transform: scale(0.8) rotate(-5deg);
-            }
-            to { 
-                opacity: 1; 
-                transform: scale(1) rotate(0deg);
-            }
-        }
-        
-        @keyframes textFadeIn {
-            from { opacity: 0; transform: translateY(5px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        
-        .customization-section {
-            animation: slideInFromLeft 0.5s ease-out;
-            transition: all 0.3s ease;
-        }
-        
-        .customization-section:hover {
-            transform: translateX(5px);
-        }
-        
-        @keyframes slideInFromLeft {
-            from { opacity: 0; transform: translateX(-20px); }
-            to { opacity: 1; transform: translateX(0); }
-        }
-        
-        /* Smooth transitions for select boxes */
-        .stSelectbox > div > div {
-            transition: all 0.2s ease !important;
-        }
-        
-        .stSelectbox > div > div:hover {
-            transform: translateY(-1px);
-            box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-        }
-        </style>
-        """, unsafe_allow_html=True)
+                # Random avatar button; the click's own rerun picks up the new selections.
+                # The avatarSlideIn animation covers the swap client-side
+                st.button("🎲 Random Avatar", use_container_width=True, key=f"{customizer_key}_random",
+                          on_click=self._apply_random_avatar, args=(customizer_key,))
         
         # Return the final config that was built from selections
         return st.session_state[f'{customizer_key}_config']
     
-    def _trigger_avatar_update(self, customizer_key):
-        """Helper method to trigger avatar preview update"""
-        # This method is called when dropdown selections change
-        # The actual update happens in the main render loop
-        pass
+    def _apply_random_avatar(self, customizer_key: str):
+        """Random button callback: store a random config and move the selectboxes to it"""
+        # Keyed widgets ignore index= once they exist, so their session_state values are set
+        # directly; callbacks run before the script, while the widgets can still be written
+        config = self.generate_random_avatar()
+        st.session_state[f'{customizer_key}_config'] = config
+        for suffix, category, field in self._CUSTOMIZER_WIDGETS:
+            st.session_state[f'{customizer_key}_{suffix}'] = \
+                self._OPTION_NAMES[category][self._OPTION_INDEX[category][config[field]]]
     
     def get_avatar_achievements(self, user_stats: Dict) -> List[str]:
         """Get available avatar achievements based on user stats"""
+        values = tuple(user_stats.get(stat, default) for stat, default, _, _ in self._ACHIEVEMENT_TABLES)
+        return list(self._achievements_for(values))
+    
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _achievements_for(values: tuple) -> tuple:
+        """Unlocks reached by each stat value, in table order; shared, so returned as a tuple"""
         achievements = []
-        
-        level = user_stats.get('level', 1)
-        streak = user_stats.get('current_streak', 0)
-        badges = user_stats.get('badges_count', 0)
-        
-        # Level-based unlocks
-        if level >= 5:
-            achievements.append("🎩 Fancy Hat (Level 5+)")
-        if level >= 10:
-            achievements.append("👑 Crown (Level 10+)")
-        if level >= 15:
-            achievements.append("🕶️ Cool Sunglasses (Level 15+)")
-        
-        # Streak-based unlocks
-        if streak >= 7:
-            achievements.append("🔥 Fire Hair (7-day streak)")
-        if streak >= 30:
-            achievements.append("⚡ Lightning Hair (30-day streak)")
-        
-        # Badge-based unlocks
-        if badges >= 5:
-            achievements.append("💎 Diamond Earrings (5+ badges)")
-        if badges >= 10:
-            achievements.append("🌟 Star Crown (10+ badges)")
-        
-        return achievements
\ No newline at end of file
+        for value, (_, _, thresholds, unlocks) in zip(values, AvatarGenerator._ACHIEVEMENT_TABLES):
+            # Every unlock whose threshold the stat has reached
+            achievements.extend(unlocks[:bisect_right(thresholds, value)])
+        return tuple(achievements)
+
+# Initialize avatar generator
+@st.cache_resource
+def get_avatar_generator():
+    return AvatarGenerator()
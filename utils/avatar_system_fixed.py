@@ -1,111 +1,117 @@
 import streamlit as st
 import random
-import base64
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, Tuple
+from urllib.parse import quote
+
+# Static SVG for each accessory; anything not listed draws nothing
+_FIXED_ACCESSORY_SVG = {
+    'glasses': '<rect x="45" y="60" width="20" height="15" fill="none" stroke="#333" stroke-width="2" rx="8"/><rect x="85" y="60" width="20" height="15" fill="none" stroke="#333" stroke-width="2" rx="8"/><line x1="65" y1="67" x2="85" y2="67" stroke="#333" stroke-width="2"/>',
+    'hat': '<rect x="30" y="25" width="90" height="15" fill="#4169E1" rx="5"/><rect x="25" y="35" width="100" height="8" fill="#4169E1"/>',
+    'headband': '<rect x="35" y="45" width="80" height="6" fill="#FF69B4" rx="3"/>',
+}
 
 class FixedAvatarGenerator:
     """Simplified avatar generator with real-time updates and robust error handling"""
     
-    def __init__(self):
-        self.avatar_options = {
-            'skin_tones': {
-                'Light': '#FDBCB4',
-                'Fair': '#F1C27D', 
-                'Medium': '#E0AC69',
-                'Olive': '#C68642',
-                'Dark': '#8D5524',
-                'Deep': '#654321'
-            },
-            'hair_styles': {
-                'Short': 'short',
-                'Medium': 'medium',
-                'Long': 'long',
-                'Curly': 'curly',
-                'Wavy': 'wavy',
-                'Straight': 'straight'
-            },
-            'hair_colors': {
-                'Black': '#000000',
-                'Brown': '#8B4513',
-                'Blonde': '#DAA520',
-                'Red': '#CD853F',
-                'Auburn': '#A0522D',
-                'Gray': '#808080'
-            },
-            'eye_colors': {
-                'Brown': '#8B4513',
-                'Blue': '#4169E1',
-                'Green': '#228B22',
-                'Hazel': '#DAA520',
-                'Gray': '#708090',
-                'Amber': '#FFBF00'
-            },
-            'expressions': {
-                'Happy': 'smile',
-                'Neutral': 'neutral',
-                'Excited': 'excited',
-                'Confident': 'confident',
-                'Friendly': 'friendly',
-                'Thoughtful': 'thoughtful'
-            },
-            'accessories': {
-                'None': 'none',
-                'Glasses': 'glasses',
-                'Hat': 'hat',
-                'Headband': 'headband',
-                'Earrings': 'earrings',
-                'Necklace': 'necklace'
-            }
+    # Option label -> value, shared by all instances
+    avatar_options = {
+        'skin_tones': {
+            'Light': '#FDBCB4',
+            'Fair': '#F1C27D', 
+            'Medium': '#E0AC69',
+            'Olive': '#C68642',
+            'Dark': '#8D5524',
+            'Deep': '#654321'
+        },
+        'hair_styles': {
+            'Short': 'short',
+            'Medium': 'medium',
+            'Long': 'long',
+            'Curly': 'curly',
+            'Wavy': 'wavy',
+            'Straight': 'straight'
+        },
+        'hair_colors': {
+            'Black': '#000000',
+            'Brown': '#8B4513',
+            'Blonde': '#DAA520',
+            'Red': '#CD853F',
+            'Auburn': '#A0522D',
+            'Gray': '#808080'
+        },
+        'eye_colors': {
+            'Brown': '#8B4513',
+            'Blue': '#4169E1',
+            'Green': '#228B22',
+            'Hazel': '#DAA520',
+            'Gray': '#708090',
+            'Amber': '#FFBF00'
+        },
+        'expressions': {
+            'Happy': 'smile',
+            'Neutral': 'neutral',
+            'Excited': 'excited',
+            'Confident': 'confident',
+            'Friendly': 'friendly',
+            'Thoughtful': 'thoughtful'
+        },
+        'accessories': {
+            'None': 'none',
+            'Glasses': 'glasses',
+            'Hat': 'hat',
+            'Headband': 'headband',
+            'Earrings': 'earrings',
+            'Necklace': 'necklace'
         }
+    }
     
-    def generate_random_avatar(self) -> Dict[str, str]:
-        """Generate a random avatar configuration safely"""
-        try:
-            return {
-                'skin_tone': random.choice(list(self.avatar_options['skin_tones'].values())),
-                'hair_style': random.choice(list(self.avatar_options['hair_styles'].values())),
-                'hair_color': random.choice(list(self.avatar_options['hair_colors'].values())),
-                'eye_color': random.choice(list(self.avatar_options['eye_colors'].values())),
-                'expression': random.choice(list(self.avatar_options['expressions'].values())),
-                'accessory': random.choice(list(self.avatar_options['accessories'].values()))
-            }
-        except Exception:
-            # Safe fallback
-            return {
-                'skin_tone': '#FDBCB4',
-                'hair_style': 'short',
-                'hair_color': '#8B4513',
-                'eye_color': '#4169E1',
-                'expression': 'smile',
-                'accessory': 'none'
-            }
+    # Selectbox labels per category, in display order
+    _OPTION_NAMES = {category: tuple(options) for category, options in avatar_options.items()}
     
-    def render_avatar_svg(self, config: Dict[str, str]) -> str:
-        """Render avatar as SVG with safe defaults"""
-        # Safe config with defaults
-        safe_config = {
-            'skin_tone': config.get('skin_tone', '#FDBCB4'),
-            'hair_style': config.get('hair_style', 'short'),
-            'hair_color': config.get('hair_color', '#8B4513'),
-            'eye_color': config.get('eye_color', '#4169E1'),
-            'expression': config.get('expression', 'smile'),
-            'accessory': config.get('accessory', 'none')
-        }
-        
-        # Create SVG with safe values
-        svg = f"""
+    # Option value -> selectbox position, per category
+    _OPTION_INDEX = {
+        category: {value: i for i, value in enumerate(options.values())}
+        for category, options in avatar_options.items()
+    }
+    
+    # (selectbox key, option category, config field) for each customizer selectbox
+    _CUSTOMIZER_WIDGETS = (
+        ('avatar_skin', 'skin_tones', 'skin_tone'),
+        ('avatar_hair_style', 'hair_styles', 'hair_style'),
+        ('avatar_hair_color', 'hair_colors', 'hair_color'),
+        ('avatar_eyes', 'eye_colors', 'eye_color'),
+        ('avatar_expression', 'expressions', 'expression'),
+        ('avatar_accessory', 'accessories', 'accessory'),
+    )
+    
+    # Session-state keys owned by the customizer, registered for _clear_avatar_customizer_state
+    _CUSTOMIZER_KEYS = ('live_avatar_config',) + tuple(key for key, _, _ in _CUSTOMIZER_WIDGETS)
+    
+    # Config field and the option values it is drawn from, for generate_random_avatar
+    _RANDOM_POOLS = (
+        ('skin_tone', tuple(avatar_options['skin_tones'].values())),
+        ('hair_style', tuple(avatar_options['hair_styles'].values())),
+        ('hair_color', tuple(avatar_options['hair_colors'].values())),
+        ('eye_color', tuple(avatar_options['eye_colors'].values())),
+        ('expression', tuple(avatar_options['expressions'].values())),
+        ('accessory', tuple(avatar_options['accessories'].values())),
+    )
+    
+    # Whole-avatar SVG with %-style holes for the config-dependent colors and accessory
+    _SVG_TEMPLATE = """
         <svg width="150" height="150" viewBox="0 0 150 150" xmlns="http://www.w3.org/2000/svg">
             <!-- Background circle -->
-            <circle cx="75" cy="75" r="70" fill="{safe_config['skin_tone']}" stroke="#ccc" stroke-width="2"/>
+            <circle cx="75" cy="75" r="70" fill="%(skin)s" stroke="#ccc" stroke-width="2"/>
             
             <!-- Hair -->
-            <path d="M20 60 Q75 10 130 60 Q130 40 75 30 Q20 40 20 60" fill="{safe_config['hair_color']}"/>
+            <path d="M20 60 Q75 10 130 60 Q130 40 75 30 Q20 40 20 60" fill="%(hair)s"/>
             
             <!-- Eyes -->
             <circle cx="55" cy="65" r="8" fill="white"/>
             <circle cx="95" cy="65" r="8" fill="white"/>
-            <circle cx="55" cy="65" r="5" fill="{safe_config['eye_color']}"/>
-            <circle cx="95" cy="65" r="5" fill="{safe_config['eye_color']}"/>
+            <circle cx="55" cy="65" r="5" fill="%(eye)s"/>
+            <circle cx="95" cy="65" r="5" fill="%(eye)s"/>
             
             <!-- Nose -->
             <circle cx="75" cy="80" r="2" fill="#FFB6C1"/>
@@ -114,29 +120,80 @@ class FixedAvatarGenerator:
             <path d="M65 95 Q75 105 85 95" stroke="#FF69B4" stroke-width="3" fill="none"/>
             
             <!-- Accessory based on type -->
-            {self._render_accessory(safe_config['accessory'])}
+            %(accessory)s
         </svg>
         """
-        return svg
     
-    def _render_accessory(self, accessory_type: str) -> str:
-        """Render accessory SVG element"""
-        if accessory_type == 'glasses':
-            return '<rect x="45" y="60" width="20" height="15" fill="none" stroke="#333" stroke-width="2" rx="8"/><rect x="85" y="60" width="20" height="15" fill="none" stroke="#333" stroke-width="2" rx="8"/><line x1="65" y1="67" x2="85" y2="67" stroke="#333" stroke-width="2"/>'
-        elif accessory_type == 'hat':
-            return '<rect x="30" y="25" width="90" height="15" fill="#4169E1" rx="5"/><rect x="25" y="35" width="100" height="8" fill="#4169E1"/>'
-        elif accessory_type == 'headband':
-            return '<rect x="35" y="45" width="80" height="6" fill="#FF69B4" rx="3"/>'
-        else:
-            return ''
+    def generate_random_avatar(self) -> Dict[str, str]:
+        """Generate a random avatar configuration safely"""
+        try:
+            choice = random.choice
+            return {field: choice(pool) for field, pool in self._RANDOM_POOLS}
+        except Exception:
+            # Safe fallback
+            return {
+                'skin_tone': '#FDBCB4',
+                'hair_style': 'short',
+                'hair_color': '#8B4513',
+                'eye_color': '#4169E1',
+                'expression': 'smile',
+                'accessory': 'none'
+            }
+    
+    @staticmethod
+    def _config_key(config: Dict[str, str]) -> tuple:
+        """Safe config with defaults, as a hashable key for the render caches"""
+        return (
+            config.get('skin_tone', '#FDBCB4'),
+            config.get('hair_style', 'short'),
+            config.get('hair_color', '#8B4513'),
+            config.get('eye_color', '#4169E1'),
+            config.get('expression', 'smile'),
+            config.get('accessory', 'none')
+        )
+    
+    def render_avatar_svg(self, config: Dict[str, str]) -> str:
+        """Render avatar as SVG with safe defaults"""
+        return self._build_svg(*self._config_key(config))
+    
+    def render_avatar_data_url(self, config: Dict[str, str]) -> str:
+        """Avatar SVG as a data: URL for st.image / <img>"""
+        return self._build_data_url(*self._config_key(config))
+    
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _build_svg(skin_tone: str, hair_style: str, hair_color: str,
+                   eye_color: str, expression: str, accessory: str) -> str:
+        """Build the avatar SVG; output depends only on the config fields, so it's memoized"""
+        return FixedAvatarGenerator._SVG_TEMPLATE % {
+            'skin': skin_tone,
+            'hair': hair_color,
+            'eye': eye_color,
+            'accessory': _FIXED_ACCESSORY_SVG.get(accessory, ''),
+        }
     
-    def render_avatar_customizer_with_live_update(self, current_config: Dict[str, str]) -> Dict[str, str]:
-        """Render avatar customizer with real-time updates"""
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _build_data_url(*fields: str) -> str:
+        """Percent-encoded data URL of _build_svg's output, memoized alongside it"""
+        return "data:image/svg+xml;charset=utf-8," + quote(FixedAvatarGenerator._build_svg(*fields), safe=" /:=;,'()<>")
+    
+    def render_avatar_customizer_with_live_update(self, current_config: Dict[str, str],
+                                                  save_label: str = None) -> Tuple[Dict[str, str], bool]:
+        """Render avatar customizer with real-time updates
+        
+        Pending selections only reach the script through the form's submit buttons,
+        so a caller that saves the avatar passes save_label to get a save button
+        inside the form. Returns the config and whether that button was clicked.
+        """
         
         # Initialize session state for real-time updates
         if 'live_avatar_config' not in st.session_state:
             st.session_state.live_avatar_config = current_config.copy()
         
+        # Register the keys we own so callers can clear them without scanning session_state
+        st.session_state.setdefault('_avatar_customizer_keys', set()).update(self._CUSTOMIZER_KEYS)
+        
         st.markdown("### 🎨 Avatar Customizer")
         
         # Create two columns for customization and preview
@@ -145,76 +202,83 @@ class FixedAvatarGenerator:
         with col1:
             st.markdown("#### Customize Your Look")
             
-            # Helper function to get current option index
-            def get_option_index(options_dict, current_value):
-                try:
-                    return list(options_dict.values()).index(current_value)
-                except (ValueError, KeyError):
+            # Selectbox position of the current value, or the first option for unknown values.
+            # Once a widget's key is in session_state that value wins and index= is ignored, so
+            # pass the default 0 to avoid Streamlit's default-plus-Session-State warning
+            def get_option_index(category, current_value, key):
+                if key in st.session_state:
                     return 0
+                return self._OPTION_INDEX[category].get(current_value, 0)
             
-            # Skin tone
-            skin_options = list(self.avatar_options['skin_tones'].keys())
-            skin_index = get_option_index(self.avatar_options['skin_tones'], current_config.get('skin_tone'))
-            selected_skin = st.selectbox(
-                "🎨 Skin Tone", 
-                skin_options, 
-                index=skin_index,
-                key="avatar_skin"
-            )
-            
-            # Hair
-            col_hair1, col_hair2 = st.columns(2)
-            with col_hair1:
-                hair_style_options = list(self.avatar_options['hair_styles'].keys())
-                hair_style_index = get_option_index(self.avatar_options['hair_styles'], current_config.get('hair_style'))
-                selected_hair_style = st.selectbox(
-                    "💇 Hair Style", 
-                    hair_style_options, 
-                    index=hair_style_index,
-                    key="avatar_hair_style"
-                )
-            
-            with col_hair2:
-                hair_color_options = list(self.avatar_options['hair_colors'].keys())
-                hair_color_index = get_option_index(self.avatar_options['hair_colors'], current_config.get('hair_color'))
-                selected_hair_color = st.selectbox(
-                    "🎨 Hair Color", 
-                    hair_color_options, 
-                    index=hair_color_index,
-                    key="avatar_hair_color"
+            # Selections inside a form only rerun the script when applied
+            with st.form(key="avatar_live_form"):
+                # Skin tone
+                skin_options = self._OPTION_NAMES['skin_tones']
+                skin_index = get_option_index('skin_tones', current_config.get('skin_tone'), "avatar_skin")
+                selected_skin = st.selectbox(
+                    "🎨 Skin Tone", 
+                    skin_options, 
+                    index=skin_index,
+                    key="avatar_skin"
                 )
-            
-            # Eyes
-            eye_color_options = list(self.avatar_options['eye_colors'].keys())
-            eye_color_index = get_option_index(self.avatar_options['eye_colors'], current_config.get('eye_color'))
-            selected_eye_color = st.selectbox(
-                "👁️ Eye Color", 
-                eye_color_options, 
-                index=eye_color_index,
-                key="avatar_eyes"
-            )
-            
-            # Expression and accessories
-            col_exp1, col_exp2 = st.columns(2)
-            with col_exp1:
-                expression_options = list(self.avatar_options['expressions'].keys())
-                expression_index = get_option_index(self.avatar_options['expressions'], current_config.get('expression'))
-                selected_expression = st.selectbox(
-                    "😊 Expression", 
-                    expression_options, 
-                    index=expression_index,
-                    key="avatar_expression"
-                )
-            
-            with col_exp2:
-                accessory_options = list(self.avatar_options['accessories'].keys())
-                accessory_index = get_option_index(self.avatar_options['accessories'], current_config.get('accessory'))
-                selected_accessory = st.selectbox(
-                    "✨ Accessory", 
-                    accessory_options, 
-                    index=accessory_index,
-                    key="avatar_accessory"
+                
+                # Hair
+                col_hair1, col_hair2 = st.columns(2)
+                with col_hair1:
+                    hair_style_options = self._OPTION_NAMES['hair_styles']
+                    hair_style_index = get_option_index('hair_styles', current_config.get('hair_style'), "avatar_hair_style")
+                    selected_hair_style = st.selectbox(
+                        "💇 Hair Style", 
+                        hair_style_options, 
+                        index=hair_style_index,
+                        key="avatar_hair_style"
+                    )
+                
+                with col_hair2:
+                    hair_color_options = self._OPTION_NAMES['hair_colors']
+                    hair_color_index = get_option_index('hair_colors', current_config.get('hair_color'), "avatar_hair_color")
+                    selected_hair_color = st.selectbox(
+                        "🎨 Hair Color", 
+                        hair_color_options, 
+                        index=hair_color_index,
+                        key="avatar_hair_color"
+                    )
+                
+                # Eyes
+                eye_color_options = self._OPTION_NAMES['eye_colors']
+                eye_color_index = get_option_index('eye_colors', current_config.get('eye_color'), "avatar_eyes")
+                selected_eye_color = st.selectbox(
+                    "👁️ Eye Color", 
+                    eye_color_options, 
+                    index=eye_color_index,
+                    key="avatar_eyes"
                 )
+                
+                # Expression and accessories
+                col_exp1, col_exp2 = st.columns(2)
+                with col_exp1:
+                    expression_options = self._OPTION_NAMES['expressions']
+                    expression_index = get_option_index('expressions', current_config.get('expression'), "avatar_expression")
+                    selected_expression = st.selectbox(
+                        "😊 Expression", 
+                        expression_options, 
+                        index=expression_index,
+                        key="avatar_expression"
+                    )
+                
+                with col_exp2:
+                    accessory_options = self._OPTION_NAMES['accessories']
+                    accessory_index = get_option_index('accessories', current_config.get('accessory'), "avatar_accessory")
+                    selected_accessory = st.selectbox(
+                        "✨ Accessory", 
+                        accessory_options, 
+                        index=accessory_index,
+                        key="avatar_accessory"
+                    )
+                
+                st.form_submit_button("✅ Apply Changes", use_container_width=True)
+                saved = save_label is not None and st.form_submit_button(
+                    save_label, type="primary", use_container_width=True)
         
         # Build the current configuration from selections
         new_config = {
@@ -232,21 +296,27 @@ class FixedAvatarGenerator:
         with col2:
             st.markdown("#### 👁️ Live Preview")
             
-            # Display live avatar preview
-            avatar_svg = self.render_avatar_svg(new_config)
-            
-            # Convert to data URL for display
-            svg_bytes = avatar_svg.encode('utf-8')
-            svg_b64 = base64.b64encode(svg_bytes).decode('utf-8')
-            svg_data_url = f"data:image/svg+xml;base64,{svg_b64}"
+            # Display live avatar preview; the data URL is cached per config
+            svg_data_url = self.render_avatar_data_url(new_config)
             
             st.image(svg_data_url, width=150)
             st.caption("Your Avatar Preview")
             
-            # Random avatar button
-            if st.button("🎲 Generate Random", use_container_width=True):
-                random_config = self.generate_random_avatar()
-                st.session_state.live_avatar_config = random_config
-                st.rerun()
+            # Random avatar button; the click's own rerun picks up the new selections
+            st.button("🎲 Generate Random", use_container_width=True, on_click=self._apply_random_avatar)
         
-        return new_config
\ No newline at end of file
+        return new_config, saved
+    
+    def _apply_random_avatar(self):
+        """Random button callback: move the selectboxes to a random config"""
+        # Keyed widgets ignore index= once they exist, so their session_state values are set
+        # directly; callbacks run before the script, while the widgets can still be written
+        random_config = self.generate_random_avatar()
+        st.session_state.live_avatar_config = random_config
+        for key, category, field in self._CUSTOMIZER_WIDGETS:
+            st.session_state[key] = self._OPTION_NAMES[category][self._OPTION_INDEX[category][random_config[field]]]
+
+# Initialize fixed avatar generator
+@st.cache_resource
+def get_fixed_avatar_generator():
+    return FixedAvatarGenerator()